@@ -0,0 +1,368 @@
+"""
+Benchmark suite for the backend pipelines.
+
+Runs each pipeline on synthetic images and videos (no network or sample
+files needed) and records p50/p95 latency, throughput and peak RSS per case
+to JSON. With --stub the Florence-2 models are replaced by a stub that
+returns canned answers after a fixed delay, so the pipelines around the
+models can be measured without the weights. The result cache is disabled
+unless --cached is given, so every iteration does the full work.
+
+    python benchmark.py run [--stub] [--suite detect_text,medicine,pixelate,authenticate]
+                            [--repeat 5] [--concurrency 4] [--out benchmark.json]
+    python benchmark.py compare baseline.json benchmark.json [--threshold 0.15]
+
+compare exits non-zero when a case got slower (p50/p95), lost throughput or
+used more memory by more than the threshold (a fraction).
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+_workdir = tempfile.mkdtemp(prefix="benchmark-")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+if "--cached" not in sys.argv:
+    os.environ["RESULT_CACHE_MEMORY_MB"] = "0"
+    os.environ["RESULT_CACHE_PATH"] = ""
+os.environ.setdefault("JOBS_DIR", os.path.join(_workdir, "jobs"))
+os.environ.setdefault("FRAME_STORE_DIR", os.path.join(_workdir, "frames"))
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+
+from model_registry import registry, current_rss
+
+SUITES = ("detect_text", "medicine", "pixelate", "authenticate")
+LABEL_LINES = ["PARACETAMOL 650", "B.No. AB1234", "MRP Rs. 30.50", "MFG 01/2024  EXP 12/2025"]
+# Metrics compared between runs and whether higher is better
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "throughput_per_s": True, "peak_rss_mb": False}
+
+
+def make_image(width: int = 1280, height: int = 720, seed: int = 0) -> Image.Image:
+    """A noisy background with a medicine label and a face-sized blob at seeded positions."""
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    cv2.randn(frame, (90, 100, 110), (12, 12, 12))
+    label_w, label_h = width // 3, height // 3
+    x = int(rng.integers(0, width - label_w))
+    y = int(rng.integers(0, height - label_h))
+    cv2.rectangle(frame, (x, y), (x + label_w, y + label_h), (235, 235, 230), -1)
+    scale = label_h / 180
+    for i, line in enumerate(LABEL_LINES):
+        cv2.putText(frame, line, (x + label_w // 20, y + int((i + 1) * label_h / 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20), max(1, int(scale * 2)))
+    face_x = int(rng.integers(0, width - width // 8))
+    cv2.ellipse(frame, (face_x + width // 16, height // 4), (width // 16, height // 8), 0, 0, 360,
+                (160, 180, 220), -1)
+    return Image.fromarray(frame)
+
+
+def make_video(path: str, frames: int = 60, width: int = 640, height: int = 360,
+               fps: float = 30, seed: int = 0) -> str:
+    """Write a synthetic MP4 whose label drifts across the frame."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    base = np.asarray(make_image(width * 2, height, seed))
+    try:
+        for i in range(frames):
+            offset = int(i * width / max(1, frames))
+            writer.write(cv2.cvtColor(np.ascontiguousarray(base[:, offset:offset + width]), cv2.COLOR_RGB2BGR))
+    finally:
+        writer.release()
+    return path
+
+
+def make_masks(width: int, height: int, faces: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((faces, height, width), dtype=np.uint8)
+    for i in range(faces):
+        w, h = rng.integers(width // 20, width // 6), rng.integers(height // 15, height // 4)
+        x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+        masks[i, y:y + h, x:x + w] = 1
+    return masks
+
+
+def stub_answer(task_prompt: str, width: int, height: int) -> Dict:
+    """A plausible parsed Florence-2 answer for task_prompt on an image of the given size."""
+    face = [width * 0.3, height * 0.2, width * 0.42, height * 0.45]
+    if task_prompt == "<OCR>":
+        return {task_prompt: " ".join(LABEL_LINES)}
+    if task_prompt == "<OCR_WITH_REGION>":
+        quads = [[width * 0.1, height * (0.1 + 0.1 * i), width * 0.6, height * (0.1 + 0.1 * i),
+                  width * 0.6, height * (0.17 + 0.1 * i), width * 0.1, height * (0.17 + 0.1 * i)]
+                 for i in range(len(LABEL_LINES))]
+        return {task_prompt: {"quad_boxes": quads, "labels": list(LABEL_LINES)}}
+    if task_prompt in ("<OD>", "<CAPTION_TO_PHRASE_GROUNDING>"):
+        return {task_prompt: {"bboxes": [face], "labels": ["human face"]}}
+    return {task_prompt: ""}
+
+
+def install_stub_models(latency: float = 0.05, per_image: float = 0.01):
+    """
+    Replace Florence-2 generation in detect_text with a stub: every generate
+    call sleeps latency + per_image * batch size and returns stub_answer.
+    Nothing is loaded or downloaded.
+    """
+    import detect_text
+
+    def generate_batch(task_prompt, text_input, images, profile):
+        time.sleep(latency + per_image * len(images))
+        answers = []
+        for image in images:
+            result = stub_answer(task_prompt, image.width, image.height)
+            result["decode"] = {"profile": profile, "tokens_generated": 0, "decode_seconds": latency,
+                                "batch_size": len(images), "cached": False}
+            answers.append(result)
+        return answers
+
+    detect_text._generate_batch = generate_batch
+    registry.register(detect_text.model_id, lambda: (None, None), replace=True)
+
+
+def install_stub_face_models(latency: float = 0.05, per_image: float = 0.01):
+    """The same stub for FacePixelator's shared-encoder Florence-2 calls."""
+    import detect_text
+    import face_pixelator
+
+    def run_florence_tasks(model, processor, image, prompts, **generate_kwargs):
+        time.sleep(latency + per_image * len(prompts))
+        return [stub_answer(detect_text.task_of(prompt), image.width, image.height) for prompt in prompts]
+
+    face_pixelator.run_florence_tasks = run_florence_tasks
+    registry.register("microsoft/Florence-2-large-ft", lambda: (None, None), replace=True)
+
+
+class PeakRSS:
+    """Samples this process's RSS on a background thread and keeps the peak."""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def summarize(latencies: List[float], wall_seconds: float, items: int, peak_rss: int) -> Dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "mean_ms": round(float(latencies_ms.mean()), 2),
+        "throughput_per_s": round(items / wall_seconds, 3) if wall_seconds > 0 else None,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+    }
+
+
+def measure(fn: Callable[[int], object], repeat: int, items_per_call: int = 1, warmup: int = 1) -> Dict:
+    """
+    Time fn(i) for i in range(repeat), after warmup untimed calls fn(repeat),
+    fn(repeat + 1), ...; i lets each call use fresh inputs.
+    """
+    for i in range(warmup):
+        fn(repeat + i)
+    latencies = []
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        for i in range(repeat):
+            call_start = time.perf_counter()
+            fn(i)
+            latencies.append(time.perf_counter() - call_start)
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall, repeat * items_per_call, rss.peak)
+
+
+def bench_detect_text(args) -> Dict:
+    from detect_text import detect_text
+    images = {i: make_image(seed=i) for i in range(args.repeat + 1)}
+    return {
+        f"detect_text{task}": measure(lambda i: detect_text(task, image=images[i]), args.repeat)
+        for task in ("<OCR>", "<OCR_WITH_REGION>")
+    }
+
+
+def bench_medicine(args) -> Dict:
+    from medicine_detector import MedicineDetector
+    videos = {i: make_video(os.path.join(_workdir, f"medicine_{i}.mp4"), seed=100 + i)
+              for i in range(args.repeat + 1)}
+    detector = MedicineDetector()
+    return {"medicine.process_video": measure(lambda i: detector.process_video(videos[i]), args.repeat)}
+
+
+def bench_pixelate(args) -> Dict:
+    from face_pixelator import FacePixelator
+    if args.stub:
+        install_stub_face_models(args.stub_latency, args.stub_per_image)
+
+    results = {}
+    pixelator = FacePixelator()
+    image = np.asarray(make_image(1920, 1080))
+    masks = make_masks(1920, 1080, 4)
+    results["pixelate.pixelate_region"] = measure(lambda i: pixelator.pixelate_region(image, masks), args.repeat)
+
+    images = {i: make_image(seed=200 + i) for i in range(args.repeat + 1)}
+    results["pixelate.pixelate_all_faces"] = measure(lambda i: pixelator.pixelate_all_faces(images[i]), args.repeat)
+
+    frames = 90
+    videos = {i: make_video(os.path.join(_workdir, f"faces_{i}.mp4"), frames=frames, seed=300 + i)
+              for i in range(args.repeat + 1)}
+    for detect_every in (1, 15):
+        output = os.path.join(_workdir, f"pixelated_{detect_every}.mp4")
+        results[f"pixelate.process_video[detect_every={detect_every}]"] = measure(
+            lambda i: pixelator.process_video(videos[i], output, detect_every=detect_every),
+            args.repeat, items_per_call=frames)
+    return results
+
+
+def bench_authenticate(args) -> Dict:
+    from fastapi.testclient import TestClient # type: ignore
+    from main import app
+
+    total = args.repeat * args.concurrency
+    videos = []
+    for i in range(total + 1):
+        path = make_video(os.path.join(_workdir, f"authenticate_{i}.mp4"), seed=400 + i)
+        with open(path, "rb") as f:
+            videos.append(f.read())
+
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    with TestClient(app) as client:
+        def post(i):
+            start = time.perf_counter()
+            response = client.post("/api/authenticate", files={"file": (f"video_{i}.mp4", videos[i], "video/mp4")})
+            with lock:
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            return time.perf_counter() - start
+
+        post(total)
+        statuses.clear()
+        with PeakRSS() as rss, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            start = time.perf_counter()
+            latencies = list(pool.map(post, range(total)))
+            wall = time.perf_counter() - start
+    result = summarize(latencies, wall, total, rss.peak)
+    result["concurrency"] = args.concurrency
+    result["status_codes"] = statuses
+    return {"authenticate": result}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args):
+    suites = [name.strip() for name in args.suite.split(",") if name.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"Unknown suite(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(SUITES)}")
+    if args.stub:
+        install_stub_models(args.stub_latency, args.stub_per_image)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "stub": args.stub,
+            "cached": args.cached,
+            "repeat": args.repeat,
+        },
+        "cases": {},
+    }
+    for suite in suites:
+        print(f"Running {suite}...")
+        cases = globals()[f"bench_{suite}"](args)
+        for name, metrics in cases.items():
+            print(f"  {name:45s} p50 {metrics['p50_ms']:9.1f} ms  p95 {metrics['p95_ms']:9.1f} ms  "
+                  f"{metrics['throughput_per_s']:8.2f}/s  peak RSS {metrics['peak_rss_mb']:.0f} MB")
+        report["cases"].update(cases)
+    report["models"] = registry.stats()
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.out}")
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)["cases"]
+    with open(args.current) as f:
+        current = json.load(f)["cases"]
+
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = baseline[name].get(metric), current[name].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > args.threshold else ""
+            regressions += bool(flag)
+            print(f"{name:45s} {metric:17s} {before:10.2f} -> {after:10.2f} ({change:+7.1%}) {flag}")
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:45s} only in {'baseline' if name in baseline else 'current'} run")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    run_parser.add_argument("--suite", default=",".join(SUITES), help="comma separated: " + ", ".join(SUITES))
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed iterations per case")
+    run_parser.add_argument("--concurrency", type=int, default=4, help="parallel /api/authenticate clients")
+    run_parser.add_argument("--stub", action="store_true", help="replace Florence-2 with a stub model")
+    run_parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds per stub generate call")
+    run_parser.add_argument("--stub-per-image", type=float, default=0.01, help="extra stub seconds per image")
+    run_parser.add_argument("--cached", action="store_true", help="keep the result cache enabled")
+    run_parser.add_argument("--out", default="benchmark.json")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="allowed relative change before flagging (default 0.15)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,249 @@
-from transformers import AutoProcessor, AutoModelForCausalLM   # type: ignore
 from PIL import Image # type: ignore
+import torch # type: ignore
 import requests # type: ignore
 import copy
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import supervision as sv # type: ignore
-from typing import Dict
+from typing import Dict, List
+from model_registry import registry, get_florence, load_florence, variant_id
+from result_cache import result_cache, image_hash, make_key
+from metrics import stage, observe_stage, gauge, GENERATED_TOKENS, DECODE_TOKENS_PER_SECOND
 
 model_id = 'microsoft/Florence-2-large'
-model = AutoModelForCausalLM.from_pretrained(model_id, trust_remote_code=True).eval()
-processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
+# Registered at import so it can be pre-warmed; the weights load on first use
+registry.register(model_id, lambda: load_florence(model_id))
 
-def detect_text(task_prompt: str, text_input: str = "", image=None) -> Dict:
-	prompt = task_prompt + text_input
-	inputs = processor(text=prompt, images=image, return_tensors="pt")
-	generated_ids = model.generate(
-  	input_ids=inputs["input_ids"],
-  	pixel_values=inputs["pixel_values"],
-  	max_new_tokens=1024,
-  	early_stopping=False,
-  	do_sample=False,
-  	num_beams=3,
-	)
-	generated_text = processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-	parsed_answer = processor.post_process_generation(
-    	generated_text,
-    	task=task_prompt,
-    	image_size=(image.width, image.height)
+def load_model():
+	"""Shared Florence-2 (model, processor) pair, loaded on first use."""
+	return get_florence(model_id)
+
+# Named decoding profiles trading latency for accuracy. Every profile stops
+# a sequence at the end-of-sequence token; with beam search, early_stopping
+# also ends the search as soon as num_beams finished candidates exist.
+DECODING_PROFILES = {
+	"fast": {"num_beams": 1, "max_new_tokens": 256, "early_stopping": False},
+	"balanced": {"num_beams": 2, "max_new_tokens": 512, "early_stopping": True},
+	"accurate": {"num_beams": 3, "max_new_tokens": 1024, "early_stopping": False},
+}
+DEFAULT_PROFILE = "accurate"
+
+def generation_kwargs(profile: str, processor) -> Dict:
+	"""model.generate keyword arguments for a named decoding profile."""
+	if profile not in DECODING_PROFILES:
+		raise ValueError(f"Unknown decoding profile: {profile}. Choose from {', '.join(DECODING_PROFILES)}")
+	return dict(
+		DECODING_PROFILES[profile],
+		do_sample=False,
+		eos_token_id=processor.tokenizer.eos_token_id,
 	)
 
-	return parsed_answer
+def _cache_key(task_prompt: str, text_input: str, image, profile: str) -> str:
+	return make_key(variant_id(model_id), f"{task_prompt}{text_input}|{profile}", image_hash(image))
+
+def _mark_cached(answer: Dict) -> Dict:
+	if isinstance(answer.get("decode"), dict):
+		answer["decode"]["cached"] = True
+	return answer
+
+def detect_text(task_prompt: str, text_input: str = "", image=None, profile: str = DEFAULT_PROFILE) -> Dict:
+	"""
+	Run one Florence-2 task on one image; repeated images are served from the result cache.
+	The answer's "decode" entry reports the profile, tokens generated and decode time.
+	"""
+	return detect_text_batch(task_prompt, [image], text_input, profile)[0]
+
+def detect_text_batch(task_prompt: str, images: List, text_input: str = "",
+		profile: str = DEFAULT_PROFILE) -> List[Dict]:
+	"""
+	Run one task over several images with a single processor/generate call.
+	The processor resizes every image to the same input resolution, so the
+	pixel_values stack directly; prompts are padded to a common length.
+	Returns one parsed answer per image, in input order. Images already in
+	the result cache are not sent to the model.
+	"""
+	keys = [_cache_key(task_prompt, text_input, image, profile) for image in images]
+	answers = [result_cache.get(key) for key in keys]
+	missing = [i for i, answer in enumerate(answers) if answer is None]
+	for i, answer in enumerate(answers):
+		if answer is not None:
+			_mark_cached(answer)
+	if missing:
+		generated = _generate_batch(task_prompt, text_input, [images[i] for i in missing], profile)
+		for i, answer in zip(missing, generated):
+			result_cache.put(keys[i], answer)
+			answers[i] = answer
+	return answers
+
+def _record_decode(task_prompt: str, num_tokens: int, seconds: float):
+	GENERATED_TOKENS.inc(num_tokens, task=task_prompt)
+	if seconds > 0:
+		DECODE_TOKENS_PER_SECOND.observe(num_tokens / seconds, task=task_prompt)
+
+def _encode(model, input_ids, pixel_values):
+	"""Run the vision encoder and merge its features into the prompt embeddings."""
+	image_features = model._encode_image(pixel_values)
+	embeds = model.get_input_embeddings()(input_ids)
+	embeds, _ = model._merge_input_ids_with_image_features(image_features, embeds)
+	return image_features, embeds
+
+def _generate_batch(task_prompt: str, text_input: str, images: List, profile: str) -> List[Dict]:
+	model, processor = load_model()
+	kwargs = generation_kwargs(profile, processor)
+	prompt = task_prompt + text_input
+	with stage("preprocess"):
+		inputs = processor(text=[prompt] * len(images), images=images, return_tensors="pt", padding=True)
+	with torch.inference_mode():
+		# Encoding here instead of inside generate lets the two be timed apart
+		with stage("vision_encode"):
+			_, embeds = _encode(model, inputs["input_ids"], inputs["pixel_values"])
+		start = time.perf_counter()
+		generated_ids = model.generate(
+			input_ids=inputs["input_ids"],
+			inputs_embeds=embeds,
+			**kwargs,
+		)
+		decode_seconds = time.perf_counter() - start
+	observe_stage("decode", decode_seconds)
+	# Generated ids start with the decoder start token and are padded after EOS
+	tokens = ((generated_ids != processor.tokenizer.pad_token_id).sum(dim=1) - 1).tolist()
+	_record_decode(task_prompt, sum(tokens), decode_seconds)
+	answers = []
+	with stage("postprocess"):
+		generated_texts = processor.batch_decode(generated_ids, skip_special_tokens=False)
+		for generated_text, image, num_tokens in zip(generated_texts, images, tokens):
+			answer = processor.post_process_generation(
+				generated_text,
+				task=task_prompt,
+				image_size=(image.width, image.height)
+			)
+			answer["decode"] = {
+				"profile": profile,
+				"tokens_generated": int(num_tokens),
+				# The batch shares one generate call, so its time is reported for each image
+				"decode_seconds": round(decode_seconds, 3),
+				"batch_size": len(images),
+				"cached": False,
+			}
+			answers.append(answer)
+	return answers
+
+class MicroBatcher:
+	"""
+	Collects detect_text requests coming from concurrent callers and runs them
+	through detect_text_batch. A batch is flushed when it reaches max_batch
+	images or when the oldest request has waited max_wait seconds. Requests
+	are grouped by (task_prompt, text_input, profile) since a batch shares one
+	prompt and one set of decoding settings.
+	"""
+	def __init__(self, max_batch: int = 4, max_wait: float = 0.05):
+		self.max_batch = max_batch
+		self.max_wait = max_wait
+		self._requests = queue.Queue()
+		self._thread = None
+		self._lock = threading.Lock()
+
+	def _ensure_started(self):
+		with self._lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._run, name="detect-text-batcher", daemon=True)
+				self._thread.start()
+
+	def submit(self, task_prompt: str, image, text_input: str = "", profile: str = DEFAULT_PROFILE) -> Future:
+		"""Queue one image and return a Future resolving to its parsed answer."""
+		future = Future()
+		self._ensure_started()
+		self._requests.put(((task_prompt, text_input, profile), image, future))
+		return future
+
+	def detect(self, task_prompt: str, image, text_input: str = "", profile: str = DEFAULT_PROFILE) -> Dict:
+		"""Blocking drop-in for detect_text that goes through the batcher."""
+		return self.submit(task_prompt, image, text_input, profile).result()
+
+	def _collect(self) -> List:
+		pending = [self._requests.get()]
+		deadline = time.monotonic() + self.max_wait
+		while len(pending) < self.max_batch:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				break
+			try:
+				pending.append(self._requests.get(timeout=remaining))
+			except queue.Empty:
+				break
+		return pending
+
+	def _run(self):
+		while True:
+			pending = self._collect()
+			groups: Dict = {}
+			for group_key, image, future in pending:
+				groups.setdefault(group_key, []).append((image, future))
+			for (task_prompt, text_input, profile), group in groups.items():
+				futures = [future for _, future in group]
+				try:
+					answers = detect_text_batch(task_prompt, [image for image, _ in group], text_input, profile)
+				except Exception as e:
+					for future in futures:
+						future.set_exception(e)
+					continue
+				for future, answer in zip(futures, answers):
+					future.set_result(answer)
+
+# Process-wide batcher shared by all callers; its worker thread starts on first use
+batcher = MicroBatcher()
+gauge("scanner_batcher_queue_depth", "Images waiting for the detect_text micro-batcher",
+	fn=lambda: batcher._requests.qsize())
+
+def task_of(prompt: str) -> str:
+	"""The task token a Florence-2 prompt starts with, e.g. '<OD>'."""
+	return prompt[:prompt.index(">") + 1] if prompt.startswith("<") else prompt
+
+def run_florence_tasks(model, processor, image, prompts: List[str], **generate_kwargs) -> List[Dict]:
+	"""
+	Run several Florence-2 prompts on one image while preprocessing the image
+	and running the vision encoder only once. The image features are merged
+	with each prompt's embeddings and only the decoder runs per prompt.
+	Returns one parsed answer per prompt, in order.
+	"""
+	if not prompts:
+		return []
+	with torch.inference_mode():
+		with stage("preprocess"):
+			inputs = processor(text=prompts[0], images=image, return_tensors="pt")
+		with stage("vision_encode"):
+			image_features, first_embeds = _encode(model, inputs["input_ids"], inputs["pixel_values"])
+		answers = []
+		for i, prompt in enumerate(prompts):
+			if i == 0:
+				input_ids, embeds = inputs["input_ids"], first_embeds
+			else:
+				# Tokenize the prompt alone; the image is not preprocessed again
+				input_ids = processor.tokenizer(
+					processor._construct_prompts([prompt]), return_tensors="pt"
+				)["input_ids"]
+				embeds = model.get_input_embeddings()(input_ids)
+				embeds, _ = model._merge_input_ids_with_image_features(image_features, embeds)
+			# With inputs_embeds given, generate skips its own image encoding
+			start = time.perf_counter()
+			generated_ids = model.generate(
+				input_ids=input_ids,
+				inputs_embeds=embeds,
+				**generate_kwargs,
+			)
+			decode_seconds = time.perf_counter() - start
+			observe_stage("decode", decode_seconds)
+			_record_decode(task_of(prompt), int(generated_ids.shape[1]) - 1, decode_seconds)
+			with stage("postprocess"):
+				generated_text = processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
+				answers.append(processor.post_process_generation(
+					generated_text,
+					task=task_of(prompt),
+					image_size=(image.width, image.height)
+				))
+	return answers
 
 # Example usage for basic OCR
 """
@@ -1,7 +1,6 @@
 # Import necessary libraries for image processing, ML models, and visualization
-import matplotlib.pyplot as plt # type: ignore
-import matplotlib.patches as patches # type: ignore
 from pathlib import Path
+import threading
 from PIL import Image # type: ignore
 import cv2 # type: ignore
 import torch # type: ignore
@@ -9,179 +8,255 @@ import base64
 import numpy as np # type: ignore
 import supervision as sv # type: ignore
 # Import ML model components
-from transformers import AutoModelForCausalLM, AutoProcessor # type: ignore
+from model_registry import registry, get_florence, load_florence, variant_id
+from result_cache import result_cache, image_hash, make_key
+from pipeline import run_pipeline, FramePool
+from detect_text import run_florence_tasks, generation_kwargs
+from face_tracking import KeyframeFaceTracker
+from metrics import stage, FRAMES_PROCESSED
 from sam2.build_sam import build_sam2 # type: ignore
 from sam2.sam2_image_predictor import SAM2ImagePredictor # type: ignore
 from sam2.automatic_mask_generator import SAM2AutomaticMaskGenerator # type: ignore
 
+FACES_PROMPT = "<OD>"
+SPEAKERS_PROMPT = "<CAPTION_TO_PHRASE_GROUNDING> human face (main speaker)"
+
+# Per-thread scratch buffers reused from frame to frame
+_scratch = threading.local()
+
+def annotate_boxes(image, bboxes, labels):
+    """
+    Draws labelled bounding boxes on a copy of an image with supervision.
+    Returns the annotated image as an RGB numpy array.
+    """
+    scene = np.array(image)
+    if len(bboxes) == 0:
+        return scene
+    detections = sv.Detections(
+        xyxy=np.asarray(bboxes, dtype=np.float32).reshape(-1, 4),
+        class_id=np.arange(len(bboxes)),
+    )
+    scene = sv.BoxAnnotator(color_lookup=sv.ColorLookup.INDEX).annotate(scene, detections)
+    return sv.LabelAnnotator(color_lookup=sv.ColorLookup.INDEX).annotate(scene, detections, labels=list(labels))
+
+class DirectoryDebugSink:
+    """
+    Debug sink that writes every detection result as an annotated JPEG to a
+    directory. Nothing is rendered or created until the first call.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.count = 0
+
+    def __call__(self, image, bboxes, labels):
+        if self.count == 0:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        annotated = annotate_boxes(image, bboxes, labels)
+        Image.fromarray(annotated).save(self.directory / f"{self.count:05d}.jpeg")
+        self.count += 1
+
+class OverlayDebugSink:
+    """
+    Debug sink that keeps the most recent annotated overlay in memory
+    (last_overlay) for callers that want to display or return it.
+    """
+    def __init__(self):
+        self.last_overlay = None
+
+    def __call__(self, image, bboxes, labels):
+        self.last_overlay = annotate_boxes(image, bboxes, labels)
+
 class FacePixelator:
     """
     A class for detecting and pixelating faces in images and videos using Florence-2 and SAM2 models.
     """
     def __init__(self, florence_cache_dir="./models/Florence_2",
                  sam_checkpoint="./models/sam2/sam2_hiera_large.pt",
-                 sam_config="./models/sam2/sam2_hiera_l.yaml"):
-        # Initialize Florence model for face detection with CPU only
-        self.model = AutoModelForCausalLM.from_pretrained(
-            "microsoft/Florence-2-large-ft",
-            cache_dir=florence_cache_dir,
-            device_map=None,
-            trust_remote_code=True
-        ).to('cpu')
-        
-        self.processor = AutoProcessor.from_pretrained(
-            "microsoft/Florence-2-large-ft",
-            cache_dir=florence_cache_dir,
-            trust_remote_code=True
-        )
+                 sam_config="./models/sam2/sam2_hiera_l.yaml", debug_sink=None,
+                 decoding_profile=None):
+        # Optional callable(image, bboxes, labels) receiving every detection
+        # result for visualization, e.g. DirectoryDebugSink or OverlayDebugSink
+        # (show its last_overlay for interactive use). None renders nothing.
+        self.debug_sink = debug_sink
+        # Named decoding profile from detect_text.DECODING_PROFILES; None keeps
+        # greedy decoding with up to 2048 new tokens
+        self.decoding_profile = decoding_profile
+
+        # Florence model for face detection (CPU only) is loaded on first use
+        # and shared with every other FacePixelator through the model registry
+        self.florence_model_id = "microsoft/Florence-2-large-ft"
+        self.florence_cache_dir = florence_cache_dir
+        registry.register(self.florence_model_id,
+                          lambda: load_florence(self.florence_model_id, florence_cache_dir))
         
         # Initialize SAM2 model on CPU
         self.device = torch.device('cpu')
         self.sam_checkpoint = sam_checkpoint
         self.sam_config = sam_config
 
-    def find_all_faces(self, image):
+    @property
+    def model(self):
+        return get_florence(self.florence_model_id, self.florence_cache_dir)[0]
+
+    @property
+    def processor(self):
+        return get_florence(self.florence_model_id, self.florence_cache_dir)[1]
+
+    def _run_florence(self, prompt, image):
         """
-        Detects all faces in an image using Florence model.
-        Returns: List of bounding boxes for all detected faces
+        Runs a Florence task on an image and returns the parsed results.
+        Results are cached by (model, prompt, image content).
         """
-        PROMPT = "<OD>"
-        task_type = "<OD>"
-        
-        # Process on CPU
-        inputs = self.processor(text=PROMPT, images=image, return_tensors="pt")
-        generated_ids = self.model.generate(
-            input_ids=inputs["input_ids"],
-            pixel_values=inputs["pixel_values"],
-            max_new_tokens=2048,
-            do_sample=False,
-        )
-        text_generations = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-        results = self.processor.post_process_generation(text_generations, task=task_type, 
-                                                       image_size=(image.width, image.height))
-        
-        raw_lists = []
+        return self._run_florence_tasks(image, [prompt])[0]
+
+    def _run_florence_tasks(self, image, prompts):
+        """
+        Runs several Florence prompts on one image, sharing a single vision
+        encoder pass between the prompts that are not cached yet.
+        Returns the parsed results per prompt, in order.
+        """
+        content_hash = image_hash(image)
+        keys = [make_key(variant_id(self.florence_model_id), f"{prompt}|{self.decoding_profile}", content_hash)
+                for prompt in prompts]
+        results = [result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            if self.decoding_profile is None:
+                kwargs = dict(max_new_tokens=2048, do_sample=False)
+            else:
+                kwargs = generation_kwargs(self.decoding_profile, self.processor)
+            # Process on CPU
+            generated = run_florence_tasks(
+                self.model, self.processor, image, [prompts[i] for i in missing], **kwargs
+            )
+            for i, result in zip(missing, generated):
+                result_cache.put(keys[i], result)
+                results[i] = result
+        return results
+
+    def _face_boxes(self, image, results, task_type):
+        """
+        Picks the "human face" boxes out of a Florence result
+        """
+        face_boxes = []
         for bbox, label in zip(results[task_type]['bboxes'], results[task_type]['labels']):
             if label == "human face":
-                raw_lists.append(bbox)
+                face_boxes.append(bbox)
         
-        self._display_boxes(image, results[task_type]['bboxes'], results[task_type]['labels'])
-        return raw_lists
+        if self.debug_sink is not None:
+            self.debug_sink(image, results[task_type]['bboxes'], results[task_type]['labels'])
+        return face_boxes
+
+    def find_all_faces(self, image):
+        """
+        Detects all faces in an image using Florence model.
+        Returns: List of bounding boxes for all detected faces
+        """
+        results = self._run_florence(FACES_PROMPT, image)
+        return self._face_boxes(image, results, "<OD>")
 
     def find_main_speakers(self, image):
         """
         Detects main speaking faces in an image.
         Returns: List of bounding boxes for detected main speakers
         """
-        PROMPT = "<CAPTION_TO_PHRASE_GROUNDING> human face (main speaker)"
-        task_type = "<CAPTION_TO_PHRASE_GROUNDING>"
-        
-        # Process on CPU
-        inputs = self.processor(text=PROMPT, images=image, return_tensors="pt")
-        generated_ids = self.model.generate(
-            input_ids=inputs["input_ids"],
-            pixel_values=inputs["pixel_values"],
-            max_new_tokens=2048,
-            do_sample=False,
-        )
-        text_generations = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-        results = self.processor.post_process_generation(text_generations, task=task_type, 
-                                                       image_size=(image.width, image.height))
-        
-        speaker_face_list = []
-        for bbox, label in zip(results[task_type]['bboxes'], results[task_type]['labels']):
-            if label == "human face":
-                speaker_face_list.append(bbox)
-        
-        self._display_boxes(image, results[task_type]['bboxes'], results[task_type]['labels'])
-        return speaker_face_list
+        results = self._run_florence(SPEAKERS_PROMPT, image)
+        return self._face_boxes(image, results, "<CAPTION_TO_PHRASE_GROUNDING>")
 
-    def _display_boxes(self, image, bboxes, labels):
+    def _overlap_matrix(self, boxes1, boxes2):
         """
-        Helper method to visualize detected faces with bounding boxes
-        Args:
-            image: Input image
-            bboxes: List of bounding boxes
-            labels: List of corresponding labels
+        Overlap area of every pair of boxes and the area of the smaller box
+        Returns: Tuple (overlap_area, min_area) of arrays of shape
+        (len(boxes1), len(boxes2))
         """
-        fig, ax = plt.subplots()
-        ax.imshow(image)
-        for bbox, label in zip(bboxes, labels):
-            if label == "human face":
-                x1, y1, x2, y2 = bbox
-                rect_box = patches.Rectangle((x1, y1), x2-x1, y2-y1, linewidth=1,
-                                          edgecolor='r', facecolor='none')
-                ax.add_patch(rect_box)
-                plt.text(x1, y1, label, color='white', fontsize=8,
-                        bbox=dict(facecolor='red', alpha=0.5))
-        ax.axis('off')
-        plt.show()
+        boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+        boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+        
+        x_overlap = np.clip(np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+                            - np.maximum(boxes1[:, None, 0], boxes2[None, :, 0]), 0, None)
+        y_overlap = np.clip(np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+                            - np.maximum(boxes1[:, None, 1], boxes2[None, :, 1]), 0, None)
+        overlap_area = x_overlap * y_overlap
+        
+        area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+        area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+        min_area = np.minimum(area1[:, None], area2[None, :])
+        
+        return overlap_area, min_area
 
     def _is_overlapping(self, box1, box2, threshold=0.7):
         """
         Checks if two bounding boxes overlap beyond a certain threshold
         Returns: Boolean indicating if boxes overlap significantly
         """
-        x1_min, y1_min, x1_max, y1_max = box1
-        x2_min, y2_min, x2_max, y2_max = box2
-        
-        x_overlap = max(0, min(x1_max, x2_max) - max(x1_min, x2_min))
-        y_overlap = max(0, min(y1_max, y2_max) - max(y1_min, y2_min))
-        overlap_area = x_overlap * y_overlap
-        
-        area1 = (x1_max - x1_min) * (y1_max - y1_min)
-        area2 = (x2_max - x2_min) * (y2_max - y2_min)
-        min_area = min(area1, area2)
-        
-        return overlap_area >= threshold * min_area
+        overlap_area, min_area = self._overlap_matrix([box1], [box2])
+        return bool(overlap_area[0, 0] >= threshold * min_area[0, 0])
 
-    def _filter_boxes(self, initial_boxes, new_boxes):
-        filtered_boxes = []
-        for box in initial_boxes:
-            if not any(self._is_overlapping(box, new_box) for new_box in new_boxes):
-                filtered_boxes.append(box)
-        return filtered_boxes
+    def _filter_boxes(self, initial_boxes, new_boxes, threshold=0.7):
+        """
+        Drops every initial box that significantly overlaps any new box
+        """
+        if len(initial_boxes) == 0 or len(new_boxes) == 0:
+            return list(initial_boxes)
+        overlap_area, min_area = self._overlap_matrix(initial_boxes, new_boxes)
+        overlapping = (overlap_area >= threshold * min_area).any(axis=1)
+        return [box for box, drop in zip(initial_boxes, overlapping) if not drop]
 
     def find_all_passerbys(self, image):
-        raw_lists = self.find_all_faces(image)
-        speaker_face_list = self.find_main_speakers(image)
+        """
+        Detects faces that are not main speakers, running both Florence
+        prompts on a single encoding of the image
+        """
+        faces_results, speakers_results = self._run_florence_tasks(image, [FACES_PROMPT, SPEAKERS_PROMPT])
+        raw_lists = self._face_boxes(image, faces_results, "<OD>")
+        speaker_face_list = self._face_boxes(image, speakers_results, "<CAPTION_TO_PHRASE_GROUNDING>")
         filtered_faces = self._filter_boxes(raw_lists, speaker_face_list)
         return filtered_faces
 
-    def pixelate_region(self, image, masks, pixelation_size=10):
+    def pixelate_region(self, image, masks, pixelation_size=10, inplace=False):
         """
         Applies pixelation effect to specified regions in the image
         Args:
             image: Input image
             masks: Binary masks indicating regions to pixelate
             pixelation_size: Size of pixelation blocks
+            inplace: Write into image instead of a copy
         Returns: Image with pixelated regions
+
+        Every masked pixel takes the mean colour (truncated) of the masked
+        pixels in its pixelation_size x pixelation_size block. The masks are
+        merged once and only masked pixels are touched, so the cost scales
+        with the masked area rather than blocks x masks.
         """
-        masks = masks.astype(bool)
-        height, width = image.shape[:2]
-        pixelated_image = image.copy()
-        
-        for y in range(0, height, pixelation_size):
-            for x in range(0, width, pixelation_size):
-                block_y_end = min(y + pixelation_size, height)
-                block_x_end = min(x + pixelation_size, width)
-                block = image[y:block_y_end, x:block_x_end]
-                
-                combined_block_mask = np.zeros(block.shape[:2], dtype=bool)
-                for mask in masks:
-                    block_mask = mask[y:block_y_end, x:block_x_end]
-                    combined_block_mask = np.logical_or(combined_block_mask, block_mask)
-                
-                if combined_block_mask.any():
-                    average_color = [int(np.mean(channel[combined_block_mask])) 
-                                   for channel in cv2.split(block)]
-                    for c in range(3):
-                        block[:, :, c][combined_block_mask] = average_color[c]
-                    pixelated_image[y:block_y_end, x:block_x_end] = block
-        
+        masks = np.asarray(masks)
+        if masks.ndim == 3:
+            combined_mask = masks.any(axis=0)
+        else:
+            combined_mask = masks if masks.dtype == bool else masks.astype(bool)
+        pixelated_image = image if inplace else image.copy()
+
+        ys, xs = np.nonzero(combined_mask)
+        if len(ys) == 0:
+            return pixelated_image
+
+        blocks_per_row = -(-image.shape[1] // pixelation_size)
+        num_blocks = -(-image.shape[0] // pixelation_size) * blocks_per_row
+        block_ids = (ys // pixelation_size) * blocks_per_row + xs // pixelation_size
+        counts = np.maximum(np.bincount(block_ids, minlength=num_blocks), 1)
+
+        pixels = image[ys, xs]
+        if pixels.ndim == 1:
+            pixels = pixels[:, None]
+        means = np.empty((num_blocks, pixels.shape[1]), dtype=image.dtype)
+        for c in range(pixels.shape[1]):
+            sums = np.bincount(block_ids, weights=pixels[:, c], minlength=num_blocks)
+            means[:, c] = sums.astype(np.int64) // counts
+
+        pixelated_image[ys, xs] = means[block_ids].reshape(pixels.shape[:1] + image.shape[2:])
         return pixelated_image
 
-    def process_video(self, input_video, output_video, scale_factor=1, frame_rate=30):
+    def process_video(self, input_video, output_video, scale_factor=1, frame_rate=30,
+                      debug_frames_dir=None, queue_size=4, detect_every=1, on_frame=None):
         """
         Processes a video file by pixelating faces in each frame
         Args:
@@ -189,35 +264,117 @@ class FacePixelator:
             output_video: Path for processed video
             scale_factor: Factor to resize frames
             frame_rate: Output video frame rate
+            debug_frames_dir: If set, source and pixelated frames are also
+                written there as JPEGs (like the old on-disk pipeline)
+            queue_size: Maximum frames buffered between pipeline stages
+            detect_every: Run the face detector every N frames (or on scene
+                change / lost track) and track boxes in between; 1 detects
+                on every frame
+            on_frame: Optional callable(frame_index, face_boxes) called as
+                each frame is written, for progress reporting
         """
-        # Create output directory
-        source_frames = Path(Path(input_video).stem)
-        source_frames.mkdir(parents=True, exist_ok=True)
-        
-        # Extract frames
-        cap = cv2.VideoCapture(input_video)
+        debug_dir = None
+        if debug_frames_dir is not None:
+            debug_dir = Path(debug_frames_dir)
+            (debug_dir / "pixelated").mkdir(parents=True, exist_ok=True)
+
+        out = None
+        bgr_frame = None
+        pool = FramePool()
+        try:
+            for frame_idx, source_frame, pixelated_frame, face_boxes in self.iter_pixelated_frames(
+                    input_video, scale_factor, queue_size, keep_source=debug_dir is not None,
+                    detect_every=detect_every, pool=pool):
+                with stage("frame_write"):
+                    bgr_frame = cv2.cvtColor(pixelated_frame, cv2.COLOR_RGB2BGR, dst=bgr_frame)
+                    if out is None:
+                        height, width = bgr_frame.shape[:2]
+                        out = cv2.VideoWriter(str(output_video), cv2.VideoWriter_fourcc(*'mp4v'),
+                                              frame_rate, (width, height))
+                    out.write(bgr_frame)
+                if debug_dir is not None:
+                    Image.fromarray(source_frame).save(debug_dir / f"{frame_idx:05d}.jpeg")
+                    Image.fromarray(pixelated_frame).save(debug_dir / "pixelated" / f"{frame_idx:05d}.jpeg")
+                if on_frame is not None:
+                    on_frame(frame_idx, face_boxes)
+                # Written and saved, so the decoder can fill it again
+                pool.release(pixelated_frame)
+                FRAMES_PROCESSED.inc(pipeline="pixelate")
+        finally:
+            if out is not None:
+                out.release()
+        print(f"Video saved as {output_video}")
+
+    def iter_frames(self, input_video, scale_factor=1, start=0, stop=None, pool=None):
+        """
+        Decodes a video and yields (frame_index, RGB frame) pairs for frames
+        start up to stop (exclusive; None reads to the end).
+        Decoding and resizing reuse one buffer each; with a FramePool the RGB
+        frames are written into its buffers too, and the caller releases each
+        back to the pool when done with it. Otherwise each is a new array.
+        """
+        cap = cv2.VideoCapture(str(input_video))
         if not cap.isOpened():
             raise ValueError(f"Error: Could not open video {input_video}")
-        
-        frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame = cv2.resize(frame, (0, 0), fx=scale_factor, fy=scale_factor)
-            frame_path = source_frames / f"{frame_count:05d}.jpeg"
-            cv2.imwrite(frame_path.as_posix(), frame)
-            print(f"Saved frame {frame_count} to {frame_path}")
-            frame_count += 1
-        
-        cap.release()
-        
-        # Process frames
-        self.process_images_in_folder(source_frames)
-        
-        # Combine frames
-        self.combine_frames_to_video(f"{source_frames}/pixelated", output_video, frame_rate)
+        try:
+            if start > 0:
+                with stage("video_seek"):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+                        # The backend could not seek exactly; skip frames from the start
+                        cap.release()
+                        cap = cv2.VideoCapture(str(input_video))
+                        for _ in range(start):
+                            if not cap.grab():
+                                break
+            frame_idx = start
+            decoded = scaled = None
+            while stop is None or frame_idx < stop:
+                ret, decoded = cap.read(decoded)
+                if not ret:
+                    break
+                frame = decoded
+                if scale_factor != 1:
+                    frame = scaled = cv2.resize(decoded, (0, 0), dst=scaled, fx=scale_factor, fy=scale_factor)
+                rgb = pool.next(frame.shape) if pool is not None else None
+                yield frame_idx, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+                frame_idx += 1
+        finally:
+            cap.release()
+
+    def iter_pixelated_frames(self, input_video, scale_factor=1, queue_size=4, keep_source=False,
+                              detect_every=1, pool=None):
+        """
+        Streams a video through decode -> detect -> pixelate, each stage on its
+        own thread with bounded queues in between, without touching disk.
+        Yields (frame_index, source_frame, pixelated_frame, face_boxes) in
+        order; frames are RGB arrays and source_frame is None unless
+        keep_source is set. With a FramePool, frames are decoded into its
+        buffers and pixelated in place; releasing each pixelated_frame back to
+        the pool once written keeps the number of full-size frame arrays at
+        the number in flight.
+        With detect_every > 1 faces are detected on keyframes only and
+        tracked with optical flow in between.
+        """
+        tracker = KeyframeFaceTracker(lambda frame: self.find_all_faces(Image.fromarray(frame)),
+                                      detect_every=detect_every)
+
+        def detect(item):
+            frame_idx, frame = item
+            if detect_every > 1:
+                # Includes the detector itself on keyframes
+                with stage("face_track"):
+                    return frame_idx, frame, tracker.update(frame)
+            return frame_idx, frame, self.find_all_faces(Image.fromarray(frame))
+
+        def pixelate(item):
+            frame_idx, frame, face_boxes = item
+            source = frame.copy() if keep_source else None
+            with stage("pixelate"):
+                pixelated = self._pixelate_boxes(frame, face_boxes, inplace=True)
+            return frame_idx, source, pixelated, face_boxes
+
+        return run_pipeline(self.iter_frames(input_video, scale_factor, pool=pool), [detect, pixelate], queue_size)
 
     def process_images_in_folder(self, folder_path):
         """
@@ -284,23 +441,47 @@ class FacePixelator:
         # Get face bounding boxes
         face_boxes = self.find_all_faces(image)
         
-        # Create masks for faces
+        return self._pixelate_boxes(image_array, face_boxes, inplace=True)
+
+    def _pixelate_boxes(self, image_array, face_boxes, inplace=False, pixelation_size=10):
+        """
+        Pixelates the given bounding boxes of an image array.
+        Only the block-aligned region around the boxes is masked and
+        pixelated, and its mask is carved out of a per-thread scratch buffer
+        reused across frames, so no full-frame masks are allocated.
+        """
         height, width = image_array.shape[:2]
-        masks = np.zeros((len(face_boxes), height, width), dtype=np.uint8)
-        
-        # Fill masks for each face
-        for i, box in enumerate(face_boxes):
-            x1, y1, x2, y2 = [int(coord) for coord in box]
-            masks[i, y1:y2, x1:x2] = 1
-        
-        # Apply pixelation
-        if len(masks) > 0:
-            pixelated_image = self.pixelate_region(image_array, masks)
-        else:
-            pixelated_image = image_array
-        
+        boxes = []
+        for box in face_boxes:
+            x1, y1, x2, y2 = [max(0, int(coord)) for coord in box]
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 > x1 and y2 > y1:
+                boxes.append((x1, y1, x2, y2))
+
+        pixelated_image = image_array if inplace else image_array.copy()
+        if not boxes:
+            return pixelated_image
+
+        # Start the region on a block boundary so its blocks are the image's blocks
+        left = min(box[0] for box in boxes) // pixelation_size * pixelation_size
+        top = min(box[1] for box in boxes) // pixelation_size * pixelation_size
+        right = max(box[2] for box in boxes)
+        bottom = max(box[3] for box in boxes)
+        mask = self._scratch_mask(bottom - top, right - left)
+        for x1, y1, x2, y2 in boxes:
+            mask[y1 - top:y2 - top, x1 - left:x2 - left] = True
+        self.pixelate_region(pixelated_image[top:bottom, left:right], mask, pixelation_size, inplace=True)
         return pixelated_image
 
+    def _scratch_mask(self, height, width):
+        """A cleared (height, width) bool mask backed by this thread's reusable buffer."""
+        scratch = getattr(_scratch, "mask", None)
+        if scratch is None or scratch.size < height * width:
+            scratch = _scratch.mask = np.zeros(height * width, dtype=bool)
+        mask = scratch[:height * width].reshape(height, width)
+        mask[:] = False
+        return mask
+
 def main():
     """
     Example usage of the FacePixelator class
@@ -317,7 +498,8 @@ def main():
         input_video="test.mp4",
         output_video="blur_video.mp4",
         scale_factor=1,
-        frame_rate=30
+        frame_rate=30,
+        detect_every=15
     )
 
 if __name__ == "__main__":
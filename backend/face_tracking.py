@@ -0,0 +1,107 @@
+from typing import Callable, List, Optional
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+
+
+class KeyframeFaceTracker:
+    """
+    Runs an expensive face detector only on keyframes and propagates its boxes
+    to the frames in between with sparse Lucas-Kanade optical flow.
+
+    A frame is a keyframe when detect_every frames have passed since the last
+    detection, when the scene changes (mean absolute difference of downscaled
+    grey frames above scene_change_threshold), or when tracking becomes
+    unreliable (fewer than min_confidence of a box's feature points are
+    tracked). Tracked boxes are grown by padding (fraction of box size) to
+    cover drift between detections.
+    """
+    def __init__(self, detect_fn: Callable, detect_every: int = 15,
+                 scene_change_threshold: float = 30.0, min_confidence: float = 0.5,
+                 padding: float = 0.15, max_points: int = 30):
+        self.detect_fn = detect_fn
+        self.detect_every = max(1, detect_every)
+        self.scene_change_threshold = scene_change_threshold
+        self.min_confidence = min_confidence
+        self.padding = padding
+        self.max_points = max_points
+        self.frames = 0
+        self.detections = 0
+        self._boxes: List[List[float]] = []
+        self._prev_gray: Optional[np.ndarray] = None
+        self._prev_thumb: Optional[np.ndarray] = None
+        self._since_detect = 0
+        # Grey frames alternate between two buffers (current and previous),
+        # and feature masks reuse one that is cleared after each box
+        self._grays: List[Optional[np.ndarray]] = [None, None]
+        self._mask: Optional[np.ndarray] = None
+
+    def _detect(self, rgb_frame):
+        self.detections += 1
+        self._since_detect = 0
+        self._boxes = [list(map(float, box)) for box in self.detect_fn(rgb_frame)]
+        return [list(box) for box in self._boxes]
+
+    def _scene_changed(self, thumb) -> bool:
+        if self._prev_thumb is None:
+            return True
+        return float(np.abs(thumb.astype(np.int16) - self._prev_thumb).mean()) > self.scene_change_threshold
+
+    def _track_box(self, box, gray):
+        """Moves box by the median flow of its feature points. Returns (box, confidence)."""
+        height, width = gray.shape
+        x1, y1, x2, y2 = [int(round(v)) for v in box]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return box, 0.0
+
+        if self._mask is None or self._mask.shape != gray.shape:
+            self._mask = np.zeros_like(gray)
+        mask = self._mask
+        mask[y1:y2, x1:x2] = 255
+        try:
+            points = cv2.goodFeaturesToTrack(self._prev_gray, self.max_points, 0.01, 3, mask=mask)
+        finally:
+            mask[y1:y2, x1:x2] = 0
+        if points is None or len(points) == 0:
+            return box, 0.0
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None)
+        ok = status.reshape(-1) == 1
+        confidence = float(ok.mean())
+        if not ok.any():
+            return box, 0.0
+        dx, dy = np.median((moved - points).reshape(-1, 2)[ok], axis=0)
+        return [box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy], confidence
+
+    def _padded(self, boxes, shape):
+        height, width = shape[:2]
+        padded = []
+        for x1, y1, x2, y2 in boxes:
+            pad_x, pad_y = (x2 - x1) * self.padding, (y2 - y1) * self.padding
+            padded.append([max(0.0, x1 - pad_x), max(0.0, y1 - pad_y),
+                           min(float(width), x2 + pad_x), min(float(height), y2 + pad_y)])
+        return padded
+
+    def update(self, rgb_frame) -> List[List[float]]:
+        """Returns face boxes for the next frame of the sequence (RGB array)."""
+        self.frames += 1
+        slot = self.frames % 2
+        gray = self._grays[slot] = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY, dst=self._grays[slot])
+        thumb = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA)
+
+        boxes = None
+        if self._since_detect < self.detect_every - 1 and not self._scene_changed(thumb):
+            tracked = [self._track_box(box, gray) for box in self._boxes]
+            if all(confidence >= self.min_confidence for _, confidence in tracked):
+                self._since_detect += 1
+                self._boxes = [box for box, _ in tracked]
+                boxes = self._padded(self._boxes, gray.shape)
+
+        if boxes is None:
+            boxes = self._detect(rgb_frame)
+
+        self._prev_gray = gray
+        self._prev_thumb = thumb
+        return boxes
@@ -0,0 +1,118 @@
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from metrics import stage, observe_stage
+
+# Reported frame rates outside this range are treated as missing; browser
+# recorded WebM reports 0 or the container's 1000 fps timebase
+_PLAUSIBLE_FPS = (1.0, 240.0)
+_DEFAULT_FPS = 30.0
+
+
+class FrameSource:
+    """
+    A video read in sequential passes, never by seeking. Every frame is
+    grabbed, but only the frames a caller asks for are retrieved (converted
+    out of the decoder) and, if max_width is set, downscaled.
+
+    Frame count and timestamps come from the stream as it is read rather
+    than from the container header, which browser-recorded WebM often leaves
+    at 0. They are exact once a full pass has run; count_frames() runs a
+    grab-only one if none has.
+    """
+    def __init__(self, path: str, max_width: Optional[int] = None):
+        self.path = str(path)
+        self.max_width = max_width
+        with stage("video_open"):
+            cap = cv2.VideoCapture(self.path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Error opening video file: {self.path}")
+            self.reported_fps = cap.get(cv2.CAP_PROP_FPS)
+            self.reported_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+        # Seconds from the start of the stream per frame, after a full pass
+        self.timestamps: Optional[List[float]] = None
+
+    def frames(self, wanted: Optional[Iterable[int]] = None,
+               max_width: Optional[int] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Yield (index, timestamp in seconds, BGR frame) for every frame, or
+        only for the wanted indices, stopping after the last of them.
+        max_width overrides the source's own for this pass.
+        """
+        wanted = None if wanted is None else set(wanted)
+        return self._pass(wanted, wanted is None, max_width or self.max_width)
+
+    def count_frames(self) -> int:
+        """Number of frames in the stream, counted with a grab-only pass if not known yet."""
+        if self.timestamps is None:
+            for _ in self._pass(set(), True, None):
+                pass
+        return len(self.timestamps)
+
+    @property
+    def frame_count(self) -> int:
+        """Frame count from the stream if known, else the container's (which may be 0)."""
+        return len(self.timestamps) if self.timestamps is not None else self.reported_frame_count
+
+    @property
+    def fps(self) -> float:
+        low, high = _PLAUSIBLE_FPS
+        if low <= self.reported_fps <= high:
+            return self.reported_fps
+        if self.timestamps and len(self.timestamps) > 1 and self.timestamps[-1] > self.timestamps[0]:
+            return (len(self.timestamps) - 1) / (self.timestamps[-1] - self.timestamps[0])
+        return _DEFAULT_FPS
+
+    def timestamp(self, index: int) -> float:
+        """Presentation time of frame index in seconds."""
+        if self.timestamps is not None and index < len(self.timestamps):
+            return self.timestamps[index]
+        return index / self.fps
+
+    def _pass(self, wanted, full: bool, max_width: Optional[int]):
+        last = max(wanted) if wanted else -1
+        with stage("video_open"):
+            cap = cv2.VideoCapture(self.path)
+        timestamps: List[float] = []
+        decode_seconds = 0.0
+        try:
+            index = 0
+            while full or index <= last:
+                start = time.perf_counter()
+                if not cap.grab():
+                    self.timestamps = _monotonic(timestamps, self.reported_fps)
+                    break
+                timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+                frame = None
+                if wanted is None or index in wanted:
+                    ret, frame = cap.retrieve()
+                    if ret and max_width and frame.shape[1] > max_width:
+                        height, width = frame.shape[:2]
+                        size = (max_width, max(1, round(height * max_width / width)))
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    elif not ret:
+                        frame = None
+                decode_seconds += time.perf_counter() - start
+                if frame is not None:
+                    yield index, timestamps[-1], frame
+                index += 1
+        finally:
+            cap.release()
+            observe_stage("frame_decode", decode_seconds)
+
+
+def _monotonic(timestamps: List[float], reported_fps: float) -> List[float]:
+    """
+    Stream timestamps, rebased to start at 0, or evenly spaced ones when the
+    backend reports none (all equal) or they run backwards.
+    """
+    if len(timestamps) > 1 and all(b > a for a, b in zip(timestamps, timestamps[1:])):
+        return [t - timestamps[0] for t in timestamps]
+    low, high = _PLAUSIBLE_FPS
+    fps = reported_fps if low <= reported_fps <= high else _DEFAULT_FPS
+    return [i / fps for i in range(len(timestamps))]
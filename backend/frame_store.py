@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from typing import Optional
+
+from PIL import Image # type: ignore
+
+# How processed frames are returned in API responses; smaller responses are
+# opt-in (per request or with RESPONSE_IMAGE_MODE), full-resolution by default
+IMAGE_MODES = ("none", "thumbnail", "url", "full")
+DEFAULT_IMAGE_MODE = os.environ.get("RESPONSE_IMAGE_MODE", "full")
+# Longest side of thumbnails in pixels (THUMBNAIL_SIZE, default 320)
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "320"))
+
+_FRAME_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def encode_jpeg(image: Image.Image, max_size: Optional[int] = None, quality: int = 80) -> bytes:
+    """JPEG-encode a PIL image, first shrinking it so its longest side is at most max_size."""
+    if max_size is not None and max(image.size) > max_size:
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.BILINEAR)
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+class FrameStore:
+    """
+    Content-addressed directory of encoded frames served by URL. The frame id
+    is derived from the JPEG bytes, so it doubles as a strong ETag and a frame
+    is only written once however often it is requested.
+
+    With max_bytes set, the least recently stored frames (by file mtime,
+    which storing a frame again refreshes) are deleted once the directory
+    grows past it, down to 90% of the cap.
+    """
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Other workers write here too, so this is only an estimate between
+        # evictions, which rescan the directory
+        self._bytes = self._scan_size()
+
+    def put(self, jpeg_bytes: bytes) -> str:
+        frame_id = hashlib.sha256(jpeg_bytes).hexdigest()[:32]
+        path = self.path(frame_id)
+        try:
+            # Already stored; mark it recently used
+            os.utime(path)
+            return frame_id
+        except FileNotFoundError:
+            pass
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jpeg_bytes)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(jpeg_bytes)
+            if self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._evict()
+        return frame_id
+
+    def _frames(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".jpg"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._frames())
+
+    def _evict(self):
+        frames = sorted(self._frames(), key=lambda frame: frame[2])
+        total = sum(size for _, size, _ in frames)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for path, size, _ in frames:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._bytes = total
+        print(f"Debug - Frame store evicted {evicted} frames, {total} bytes left")
+
+    def path(self, frame_id: str) -> str:
+        if not _FRAME_ID.match(frame_id):
+            raise ValueError(f"Invalid frame id: {frame_id}")
+        return os.path.join(self.directory, f"{frame_id}.jpg")
+
+
+def frame_store_from_env() -> FrameStore:
+    """
+    Build a FrameStore from environment variables:
+        FRAME_STORE_DIR      directory of stored frames (default .cache/frames)
+        FRAME_STORE_MAX_MB   size at which the oldest frames are evicted,
+                             0 disables eviction (default 1024)
+    """
+    max_mb = float(os.environ.get("FRAME_STORE_MAX_MB", "1024"))
+    return FrameStore(
+        os.environ.get("FRAME_STORE_DIR", ".cache/frames"),
+        max_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None,
+    )
+
+
+frame_store = frame_store_from_env()
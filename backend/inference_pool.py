@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+
+class PoolFullError(Exception):
+    """Raised when the admission queue of an InferenceExecutor is full."""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when a job does not finish within its timeout."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model inference off the asyncio event loop.
+
+    Jobs are executed by a fixed-size thread or process pool. At most
+    ``max_workers + max_queue`` jobs are admitted at once; further submissions
+    fail fast with PoolFullError instead of piling up behind the loop.
+    Admitted jobs are served in FIFO order by the pool.
+    """
+    def __init__(self, max_workers: int = 1, max_queue: int = 4,
+                 timeout: Optional[float] = 300.0, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.kind = kind
+        self._capacity = max_workers + max_queue
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = self._make_pool()
+
+    def _make_pool(self):
+        if self.kind == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers,
+                                  thread_name_prefix="inference")
+
+    def _replace_broken(self, pool):
+        """
+        Swap in a fresh process pool after a worker died, so one crash does
+        not fail every later job. Only the first caller to see a given broken
+        pool replaces it.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+            print("Debug - Inference process pool broke, starting a new one")
+            self._pool = self._make_pool()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of admitted jobs that are running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted jobs still waiting for a worker."""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """
+        Submit fn(*args, **kwargs) to the pool and await its result.
+        Raises PoolFullError if no slot is free and InferenceTimeoutError if the
+        job takes longer than timeout (defaults to the executor's timeout).
+        """
+        with self._lock:
+            if self._in_flight >= self._capacity:
+                raise PoolFullError(
+                    f"Inference queue is full ({self._in_flight}/{self._capacity} jobs)"
+                )
+            self._in_flight += 1
+
+        pool = self._pool
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._release()
+            self._replace_broken(pool)
+            raise
+        except Exception:
+            self._release()
+            raise
+        # The slot is freed when the job actually finishes, not when the caller
+        # stops waiting: a timed-out thread keeps its worker busy until it returns.
+        future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise InferenceTimeoutError(f"Inference did not finish within {timeout}s")
+        except BrokenProcessPool:
+            self._replace_broken(pool)
+            raise
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def executor_from_env() -> InferenceExecutor:
+    """
+    Build an InferenceExecutor from environment variables:
+        INFERENCE_WORKERS      pool size (default 1)
+        INFERENCE_QUEUE_SIZE   jobs allowed to wait for a worker (default 4)
+        INFERENCE_TIMEOUT      seconds per job, 0 disables (default 300)
+        INFERENCE_POOL         "thread" or "process" (default thread)
+    """
+    timeout = float(os.environ.get("INFERENCE_TIMEOUT", "300"))
+    return InferenceExecutor(
+        max_workers=int(os.environ.get("INFERENCE_WORKERS", "1")),
+        max_queue=int(os.environ.get("INFERENCE_QUEUE_SIZE", "4")),
+        timeout=timeout if timeout > 0 else None,
+        kind=os.environ.get("INFERENCE_POOL", "thread"),
+    )
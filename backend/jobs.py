@@ -0,0 +1,353 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are waiting to be processed."""
+
+
+class JobLeaseLostError(Exception):
+    """Raised when a worker reports on a job whose lease another worker has taken over."""
+
+
+class JobStore:
+    """
+    SQLite-backed store for jobs and their per-frame results. Safe to share
+    between threads and between processes (e.g. uvicorn workers) using the
+    same file; survives restarts, so queued jobs are not lost.
+
+    A claimed job is leased to this store's owner for lease_seconds and the
+    lease must be renewed (renew_leases) while it runs. Only jobs whose lease
+    has expired, because their worker died, are queued again.
+    """
+    def __init__(self, path: str, lease_seconds: float = 60.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "input_path TEXT, output_path TEXT, frames_done INTEGER NOT NULL DEFAULT 0, "
+                "frames_total INTEGER, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS job_frames ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, result TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, seq))"
+            )
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_expires", "REAL")):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        # Jobs interrupted by a crash or restart are picked up again
+        self.requeue_expired()
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the write lock of the database file, so other processes wait."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def create(self, kind: str, params: Dict, input_path: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, params, input_path, created, updated) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), input_path, now, now),
+            )
+        return job_id
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict]:
+        """
+        Lease the oldest queued job to this store's owner, mark it running and
+        return it, or None. The claim is a conditional UPDATE, so a job is
+        never handed to two workers even across processes.
+        """
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_expires = ?, updated = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (self.owner, now + self.lease_seconds, now, row["id"]),
+                ).rowcount
+                if claimed:
+                    break
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def renew_leases(self):
+        """Extend the lease of every job this owner is running."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, self.owner),
+            )
+
+    def requeue_expired(self) -> int:
+        """Queue running jobs whose lease has expired again, dropping their partial results."""
+        with self._transaction():
+            ids = [row["id"] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'running' "
+                "AND (lease_expires IS NULL OR lease_expires < ?)", (time.time(),)
+            )]
+            for job_id in ids:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL, "
+                    "frames_done = 0, frames_total = NULL WHERE id = ?", (job_id,)
+                )
+                self._db.execute("DELETE FROM job_frames WHERE job_id = ?", (job_id,))
+        if ids:
+            print(f"Debug - Requeued {len(ids)} jobs with expired leases")
+        return len(ids)
+
+    def delete_finished(self, older_than: float) -> int:
+        """
+        Delete done and failed jobs last updated more than older_than seconds
+        ago, with their frame results and output files.
+        """
+        with self._transaction():
+            rows = self._db.execute(
+                "SELECT id, output_path FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                (time.time() - older_than,),
+            ).fetchall()
+            for row in rows:
+                self._db.execute("DELETE FROM job_frames WHERE job_id = ?", (row["id"],))
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        for row in rows:
+            if row["output_path"] and os.path.exists(row["output_path"]):
+                os.unlink(row["output_path"])
+        if rows:
+            print(f"Debug - Deleted {len(rows)} finished jobs")
+        return len(rows)
+
+    def add_frame(self, job_id: str, result: Dict):
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT frames_done FROM jobs WHERE id = ? AND owner = ? AND status = 'running'",
+                (job_id, self.owner),
+            ).fetchone()
+            if row is None:
+                raise JobLeaseLostError(f"Job {job_id} is no longer leased to this worker")
+            seq = row[0]
+            self._db.execute(
+                "INSERT INTO job_frames (job_id, seq, result) VALUES (?, ?, ?)",
+                (job_id, seq, json.dumps(result)),
+            )
+            self._db.execute(
+                "UPDATE jobs SET frames_done = ?, updated = ? WHERE id = ?",
+                (seq + 1, time.time(), job_id),
+            )
+
+    def set_total(self, job_id: str, frames_total: Optional[int]):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET frames_total = ? WHERE id = ?", (frames_total, job_id))
+
+    def finish(self, job_id: str, status: str, output_path: Optional[str] = None, error: Optional[str] = None):
+        """Record a job's outcome; raises JobLeaseLostError if another worker has taken it over."""
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE jobs SET status = ?, output_path = COALESCE(?, output_path), error = ?, updated = ?, "
+                "lease_expires = NULL WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, output_path, error, time.time(), job_id, self.owner),
+            ).rowcount
+        if not updated:
+            raise JobLeaseLostError(f"Job {job_id} is no longer leased to this worker")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def frames(self, job_id: str, since: int = 0) -> List[Dict]:
+        """Frame results with seq >= since, in order."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, result FROM job_frames WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                (job_id, since),
+            ).fetchall()
+        return [{"seq": row["seq"], **json.loads(row["result"])} for row in rows]
+
+
+class JobContext:
+    """Handed to a job handler to report progress and per-frame results."""
+    def __init__(self, store: JobStore, job: Dict, output_dir: str):
+        self.store = store
+        self.job = job
+        self.id = job["id"]
+        self.params = job["params"]
+        self.input_path = job["input_path"]
+        self.output_dir = output_dir
+
+    def set_total(self, frames_total: Optional[int]):
+        self.store.set_total(self.id, frames_total)
+
+    def add_frame(self, result: Dict):
+        self.store.add_frame(self.id, result)
+
+
+class JobManager:
+    """
+    Runs queued jobs on a pool of worker threads. Handlers are registered per
+    job kind as callables taking a JobContext and returning an optional output
+    path; they report progress through the context as frames complete.
+
+    A maintenance thread keeps the leases of running jobs alive, requeues
+    jobs abandoned by dead workers and, if retention_seconds is set, deletes
+    finished jobs and their outputs once they are that old.
+    """
+    def __init__(self, store: JobStore, jobs_dir: str, workers: int = 1, max_queued: int = 32,
+                 retention_seconds: Optional[float] = None):
+        self.store = store
+        self.input_dir = os.path.join(jobs_dir, "inputs")
+        self.output_dir = os.path.join(jobs_dir, "outputs")
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._handlers: Dict[str, Callable] = {}
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def register(self, kind: str, handler: Callable):
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, params: Dict, input_path: Optional[str] = None) -> str:
+        """
+        Queue a job and return its id. input_path, if given, is moved into the
+        jobs directory so it survives restarts; the job deletes it when done.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.store.count("queued") >= self.max_queued:
+            raise JobQueueFullError(f"Too many queued jobs ({self.max_queued})")
+        if input_path is not None:
+            moved = os.path.join(self.input_dir, uuid.uuid4().hex + os.path.splitext(input_path)[1])
+            shutil.move(input_path, moved)
+            input_path = moved
+        job_id = self.store.create(kind, params, input_path)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._maintain, name="job-maintenance", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        self._stopped.set()
+
+    def _maintain(self):
+        # Renew well before the lease runs out
+        while not self._stopped.wait(self.store.lease_seconds / 3):
+            try:
+                self.store.renew_leases()
+                if self.store.requeue_expired():
+                    with self._wakeup:
+                        self._wakeup.notify_all()
+                if self.retention_seconds:
+                    self.store.delete_finished(self.retention_seconds)
+            except Exception as e:
+                print(f"Debug - Job maintenance failed: {e}")
+
+    def _work(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self.store.claim_next()
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(timeout=1.0)
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict):
+        context = JobContext(self.store, job, self.output_dir)
+        try:
+            try:
+                output_path = self._handlers[job["kind"]](context)
+                self.store.finish(job["id"], "done", output_path=output_path)
+            except JobLeaseLostError:
+                raise
+            except Exception as e:
+                print(f"Debug - Job {job['id']} failed: {e}")
+                traceback.print_exc()
+                self.store.finish(job["id"], "failed", error=str(e))
+        except JobLeaseLostError as e:
+            # The job was requeued and the input now belongs to its new run
+            print(f"Debug - {e}")
+            return
+        if job["input_path"] and os.path.exists(job["input_path"]):
+            os.unlink(job["input_path"])
+
+
+def manager_from_env() -> JobManager:
+    """
+    Build a JobManager from environment variables:
+        JOBS_DIR          directory for the job database and outputs (default .jobs)
+        JOB_WORKERS       worker threads (default 1)
+        JOBS_MAX_QUEUED   queued jobs accepted before submissions fail (default 32)
+        JOBS_LEASE_SECONDS  how long a running job survives its worker dying
+                            before it is queued again (default 60)
+        JOBS_RETENTION_HOURS  age at which finished jobs and their outputs are
+                              deleted, 0 keeps them (default 24)
+    """
+    jobs_dir = os.environ.get("JOBS_DIR", ".jobs")
+    retention_hours = float(os.environ.get("JOBS_RETENTION_HOURS", "24"))
+    return JobManager(
+        JobStore(os.path.join(jobs_dir, "jobs.sqlite"),
+                 lease_seconds=float(os.environ.get("JOBS_LEASE_SECONDS", "60"))),
+        jobs_dir,
+        workers=int(os.environ.get("JOB_WORKERS", "1")),
+        max_queued=int(os.environ.get("JOBS_MAX_QUEUED", "32")),
+        retention_seconds=retention_hours * 3600 if retention_hours > 0 else None,
+    )
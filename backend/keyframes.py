@@ -0,0 +1,174 @@
+import heapq
+import os
+import time
+from typing import Dict, List, Tuple, Union
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from frame_source import FrameSource
+from metrics import stage, observe_stage
+
+# Number of frames sent to the model per video (KEYFRAMES, default 2)
+DEFAULT_KEYFRAMES = int(os.environ.get("KEYFRAMES", "2"))
+# Full-size frames kept per keyframe while scoring (KEYFRAME_POOL), so the
+# chosen ones rarely need a second pass
+KEYFRAME_POOL = int(os.environ.get("KEYFRAME_POOL", "4"))
+
+# Relative weight of each quality measure in the combined frame score
+SCORE_WEIGHTS = {"sharpness": 0.5, "text_density": 0.3, "exposure": 0.2}
+
+
+def frame_quality(gray: np.ndarray) -> Dict[str, float]:
+    """
+    Cheap quality measures for a small grayscale frame:
+        sharpness     variance of the Laplacian (blur and motion lower it)
+        text_density  fraction of pixels with a strong intensity gradient
+        exposure      1 at mid-grey, falling to 0 for black/white or clipped frames
+    """
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+    gray = gray.astype(np.int16)
+    dx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    dy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    text_density = float(np.count_nonzero((dx + dy) > 48) / dx.size)
+
+    mean = float(gray.mean())
+    clipped = float(np.count_nonzero((gray < 8) | (gray > 247)) / gray.size)
+    exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0 - clipped)
+
+    return {"sharpness": sharpness, "text_density": text_density, "exposure": exposure}
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    if spread <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / spread
+
+
+def _scan(source: FrameSource, analysis_width: int = 320,
+          pool_size: int = 0) -> Tuple[np.ndarray, np.ndarray, Dict[int, np.ndarray]]:
+    """
+    One pass over the video: downscale every frame to analysis_width and
+    score it. Also keeps the full-size frames of the pool_size best frames
+    by a provisional score, from which the keyframes are usually picked.
+    Returns (scores, signatures, {frame_index: BGR frame}).
+    """
+    measures = []
+    signatures = []
+    pool: List[Tuple[float, int, np.ndarray]] = []
+    weights = np.asarray(list(SCORE_WEIGHTS.values()))
+    lows, highs = np.full(len(SCORE_WEIGHTS), np.inf), np.full(len(SCORE_WEIGHTS), -np.inf)
+    score_seconds = 0.0
+    # Without a pool nothing full-size is needed, so frames are downscaled as they are read
+    for idx, _, frame in source.frames(max_width=None if pool_size else analysis_width):
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        small = frame
+        if width > analysis_width:
+            size = (analysis_width, max(1, round(height * analysis_width / width)))
+            small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        quality = frame_quality(gray)
+        measures.append([quality[name] for name in SCORE_WEIGHTS])
+        signatures.append(cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA))
+        if pool_size:
+            # Provisional score: the final one, normalized over the frames seen so far
+            current = np.asarray(measures[-1])
+            lows, highs = np.minimum(lows, current), np.maximum(highs, current)
+            provisional = float(weights @ ((current - lows) / np.maximum(highs - lows, 1e-9)))
+            entry = (provisional, idx, frame)
+            if len(pool) < pool_size:
+                heapq.heappush(pool, entry)
+            elif entry[:2] > pool[0][:2]:
+                heapq.heapreplace(pool, entry)
+        score_seconds += time.perf_counter() - start
+    observe_stage("frame_score", score_seconds)
+
+    kept = {idx: frame for _, idx, frame in pool}
+    if not measures:
+        return np.zeros(0), np.zeros((0, 16, 16), dtype=np.uint8), kept
+
+    measures = np.asarray(measures, dtype=np.float64)
+    normalized = np.stack([_normalize(column) for column in measures.T], axis=1)
+    return normalized @ weights, np.stack(signatures), kept
+
+
+def _source(video: Union[str, FrameSource]) -> FrameSource:
+    return video if isinstance(video, FrameSource) else FrameSource(video)
+
+
+def score_video(video: Union[str, FrameSource], analysis_width: int = 320) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Decode the video once, downscale every frame to analysis_width and score it.
+    Returns (scores, signatures, fps) where scores[i] is the combined quality of
+    frame i and signatures[i] is a 16x16 thumbnail used to compare frames.
+    """
+    source = _source(video)
+    scores, signatures, _ = _scan(source, analysis_width)
+    return scores, signatures, source.fps
+
+
+def select_keyframes(scores: np.ndarray, signatures: np.ndarray, k: int = DEFAULT_KEYFRAMES,
+                     min_difference: float = 12.0) -> List[int]:
+    """
+    Pick up to k high-scoring frames that are not near-duplicates of each other.
+    Frames are taken best-first, skipping any whose signature differs from an
+    already chosen frame by less than min_difference (mean absolute grey level)
+    or that lies within len/(2k) frames of one. If that leaves fewer than k
+    frames, the best remaining ones fill the gap. Returned indices are sorted.
+    """
+    total = len(scores)
+    if total == 0 or k <= 0:
+        return []
+    k = min(k, total)
+    min_gap = total // (2 * k)
+    order = np.argsort(-scores, kind="stable")
+    flat = signatures.reshape(total, -1).astype(np.int16)
+
+    chosen: List[int] = []
+    for idx in order:
+        if len(chosen) == k:
+            break
+        if chosen:
+            gaps = np.abs(np.asarray(chosen) - idx)
+            differences = np.abs(flat[chosen] - flat[idx]).mean(axis=1)
+            if gaps.min() < min_gap or differences.min() < min_difference:
+                continue
+        chosen.append(int(idx))
+
+    for idx in order:
+        if len(chosen) == k:
+            break
+        if int(idx) not in chosen:
+            chosen.append(int(idx))
+    return sorted(chosen)
+
+
+def read_frames(video: Union[str, FrameSource], frame_indices: List[int]) -> Dict[int, np.ndarray]:
+    """
+    Read the given frames (BGR) in one sequential pass, decoding only those
+    frames and merely grabbing the rest.
+    """
+    if not frame_indices:
+        return {}
+    with stage("video_seek"):
+        return {idx: frame for idx, _, frame in _source(video).frames(frame_indices)}
+
+
+def best_frames(video: Union[str, FrameSource], k: int = DEFAULT_KEYFRAMES) -> Tuple[Dict[int, np.ndarray], float]:
+    """
+    Score every frame of the video and return ({frame_index: BGR frame}, fps)
+    for the top k. The keyframes normally come out of the scoring pass itself;
+    only a pick outside its pool of candidates costs a second, grab-only pass.
+    Pass a FrameSource to read the stream's frame count and timestamps afterwards.
+    """
+    source = _source(video)
+    scores, signatures, pool = _scan(source, pool_size=KEYFRAME_POOL * k)
+    chosen = select_keyframes(scores, signatures, k)
+    frames = {idx: pool[idx] for idx in chosen if idx in pool}
+    missing = [idx for idx in chosen if idx not in frames]
+    if missing:
+        print(f"Debug - Keyframes {missing} outside the scoring pool, reading them again")
+        frames.update(read_frames(source, missing))
+    return frames, source.fps
@@ -1,20 +1,34 @@
 from typing import Union, List
 
-from fastapi import FastAPI, UploadFile, HTTPException # type: ignore
+from fastapi import FastAPI, UploadFile, HTTPException, Request, Response # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
+from fastapi.responses import StreamingResponse, FileResponse # type: ignore
+import asyncio
+import json
+import time
 import cv2 # type: ignore
 # import torch # type: ignore
 from PIL import Image # type: ignore
-import tempfile
 import os
 # from transformers import BlipProcessor, BlipForConditionalGeneration, TrOCRProcessor, VisionEncoderDecoderModel # type: ignore
 import base64
-import io
-import easyocr # type: ignore
-import numpy as np # type: ignore
-import ollama # type: ignore
-from ocr import perform_ocr # type: ignore
-from detect_text import detect_text  # Add this import
+from ocr import shutdown_ocr_client # type: ignore
+from detect_text import batcher, model_id as florence_model_id  # Add this import
+from detect_text import DECODING_PROFILES, DEFAULT_PROFILE
+from model_registry import registry, variant_id, configure_torch_threads, current_rss
+from inference_pool import executor_from_env, PoolFullError, InferenceTimeoutError
+from uploads import save_upload, UPLOAD_OPENAPI
+from result_cache import result_cache, make_key
+from keyframes import best_frames, DEFAULT_KEYFRAMES
+from frame_source import FrameSource
+from jobs import manager_from_env, JobQueueFullError
+from ocr_cascade import ocr_cascade
+from medicine_fields import extract_fields, merge_fields, region_items
+from medicine_detector import region_text
+from roi import crop_to_text, shift_result, roi_key, ROI_CROP
+from frame_store import frame_store, encode_jpeg, IMAGE_MODES, DEFAULT_IMAGE_MODE, THUMBNAIL_SIZE
+from sharded_pixelator import process_video_sharded, PIXELATE_WORKERS
+from metrics import metrics_registry, stage, histogram, gauge, FRAMES_PROCESSED
 
 app = FastAPI()
 
@@ -35,7 +49,64 @@ app.add_middleware(
 # ocr_processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-handwritten')
 # ocr_model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-handwritten')
 
-reader = easyocr.Reader(['en'])  # for English only
+# Blocking model work runs here so the event loop stays responsive
+inference_executor = executor_from_env()
+
+# Long-running analyses run as background jobs that clients poll or stream
+job_manager = manager_from_env()
+
+# Process-level metrics, read whenever /metrics is scraped
+REQUEST_SECONDS = histogram("scanner_http_request_seconds", "HTTP request latency until the response starts",
+                            ("method", "route", "status"))
+gauge("scanner_process_rss_bytes", "Resident set size of this worker", fn=current_rss)
+gauge("scanner_inference_in_flight", "Jobs running or queued on the inference executor",
+      fn=lambda: inference_executor.in_flight)
+gauge("scanner_inference_queue_depth", "Jobs waiting for an inference worker",
+      fn=lambda: inference_executor.queue_depth)
+gauge("scanner_jobs", "Background jobs by status", ("status",),
+      fn=lambda: {(status,): job_manager.store.count(status) for status in ("queued", "running")})
+gauge("scanner_model_load_seconds", "Time taken to load each model", ("model",),
+      fn=lambda: {(name,): stats.get("load_seconds") for name, stats in registry.stats().items()})
+gauge("scanner_model_loaded", "Whether each registered model is loaded", ("model",),
+      fn=lambda: {(name,): int(stats["loaded"]) for name, stats in registry.stats().items()})
+gauge("scanner_result_cache_events_total", "Result cache hits, misses and evictions", ("event",),
+      fn=lambda: {(event,): count for event, count in result_cache.stats().items()
+                  if event in ("memory_hits", "disk_hits", "misses", "evictions")},
+      type="counter")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # The route template keeps ids out of the labels
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                            route=route, status=str(response.status_code))
+    return response
+
+@app.on_event("startup")
+def prewarm_models():
+    """
+    Size this worker's torch thread pools and load the models listed in
+    PRELOAD_MODELS (comma separated) before serving.
+    """
+    configure_torch_threads()
+    names = [name.strip() for name in os.environ.get("PRELOAD_MODELS", "").split(",") if name.strip()]
+    if names:
+        registry.prewarm(names)
+
+@app.on_event("startup")
+def start_job_workers():
+    job_manager.start()
+
+@app.on_event("shutdown")
+def shutdown_inference_executor():
+    inference_executor.shutdown(wait=False)
+    job_manager.stop()
+
+@app.on_event("shutdown")
+def close_ocr_client():
+    shutdown_ocr_client()
 
 @app.get("/")
 def read_root():
@@ -56,114 +127,387 @@ async def authenticate_product(product_data: dict):
     # Authentication logic here
     pass
 
-# Initialize the reader once (supports multiple languages if needed)
-reader = easyocr.Reader(['en'])  # for English only
+@app.get("/api/models")
+def model_stats():
+    """Load state, load time and memory per registered model"""
+    return registry.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text-format metrics for this worker"""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache")
+def cache_stats():
+    """Hit/miss counters and size of the result cache"""
+    return result_cache.stats()
+
+@app.get("/api/frames/{frame_id}.jpg")
+def get_frame(frame_id: str, request: Request):
+    """Serve a stored frame; the content-derived id is its ETag, so revalidation returns 304"""
+    try:
+        path = frame_store.path(frame_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Frame not found")
+    etag = f'"{frame_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+def _frame_image_fields(pil_image: Image.Image, image_mode: str) -> dict:
+    """
+    Response fields carrying a processed frame: nothing, a base64 thumbnail,
+    a URL to the frame in the frame store, or the full-resolution base64 JPEG
+    """
+    if image_mode == "none":
+        return {}
+    with stage("response_encode"):
+        if image_mode == "url":
+            frame_id = frame_store.put(encode_jpeg(pil_image))
+            return {"frame_url": f"/api/frames/{frame_id}.jpg"}
+        if image_mode == "thumbnail":
+            jpeg = encode_jpeg(pil_image, THUMBNAIL_SIZE)
+        else:
+            # PIL's default quality, as full frames have always been encoded
+            jpeg = encode_jpeg(pil_image, quality=75)
+        return {"frame_image": base64.b64encode(jpeg).decode()}
+
+class InvalidVideoError(ValueError):
+    """
+    Raised by _iter_video_results for videos that cannot be decoded. A plain
+    exception rather than HTTPException so it pickles back from a process
+    pool; the endpoints turn it into a 400.
+    """
+
+def _analyze_video(temp_path: str, profile: str = DEFAULT_PROFILE,
+                   image_mode: str = DEFAULT_IMAGE_MODE) -> List[dict]:
+    """
+    Decode the selected frames of a saved video and run text detection on them.
+    Blocking; runs on the inference executor.
+    """
+    results = list(_iter_video_results(temp_path, profile, image_mode))
+    print(f"Debug - Total results processed: {len(results)}")
+    return results
+
+def _merged_fields(results: List[dict]) -> dict:
+    """
+    One set of medicine fields for a video from its per-frame results (see
+    medicine_fields.merge_fields); frames whose detection failed are skipped
+    """
+    read = [result for result in results if result.get("fields")]
+    return merge_fields([result["fields"] for result in read], [result["frame_number"] for result in read])
+
+def _iter_video_results(temp_path: str, profile: str = DEFAULT_PROFILE,
+                        image_mode: str = DEFAULT_IMAGE_MODE, on_total=None):
+    """
+    Generator behind _analyze_video: yields each frame's result as soon as its
+    text detection finishes. on_total, if given, is called with the number of
+    frames that will be yielded.
+    """
+    try:
+        source = FrameSource(temp_path)
+    except ValueError:
+        raise InvalidVideoError("Could not open video file")
 
-@app.post("/api/authenticate")
-async def authenticate_video(file: UploadFile) -> List[dict]:
-    video = None
+    # Score every frame cheaply and process only the best distinct ones. The
+    # frame count and rate come from that pass, not the container header,
+    # which is often empty for browser-recorded WebM
+    keyframes, fps = best_frames(source, DEFAULT_KEYFRAMES)
+    total_frames = source.frame_count
+
+    print(f"Debug - Video properties:")
+    print(f"Debug - Path: {temp_path}")
+    print(f"Debug - Total frames: {total_frames}")
+    print(f"Debug - FPS: {fps}")
+    print(f"Debug - File size: {os.path.getsize(temp_path)} bytes")
+
+    if total_frames <= 0 or not keyframes:
+        raise InvalidVideoError(
+            "Invalid video file. Please ensure the video is properly encoded and not corrupted."
+        )
+
+    frames_to_process = sorted(keyframes)
+    print(f"Debug - Frames to process: {frames_to_process}")
+
+    frames = []
+    for frame_idx in frames_to_process:
+        # The keyframes are ours, so convert them in place
+        rgb_frame = cv2.cvtColor(keyframes[frame_idx], cv2.COLOR_BGR2RGB, dst=keyframes[frame_idx])
+        frames.append((frame_idx, Image.fromarray(rgb_frame)))
+    
+    # Submit all frames at once so they share a generate call with each
+    # other and with frames from concurrent requests. One <OCR_WITH_REGION>
+    # pass gives both the boxes the fields are paired from and the plain
+    # <OCR> text (its labels in reading order), at the cost of one generate
+    task_prompt = '<OCR_WITH_REGION>'
+    # Only the label region is read, so its text is not shrunk along with
+    # the background to the model's input size
+    crops = [crop_to_text(pil_image) if ROI_CROP else (pil_image, None) for _, pil_image in frames]
+    futures = [batcher.submit(task_prompt, crop, profile=profile) for crop, _ in crops]
+    if on_total is not None:
+        on_total(len(frames))
+    
+    for (frame_idx, pil_image), (_, roi), future in zip(frames, crops, futures):
+        try:
+            response = future.result()
+            if roi:
+                # Report boxes in frame coordinates
+                shift_result(response, roi[0], roi[1])
+            response["<OCR>"] = region_text(response.get(task_prompt, {}))
+            response["roi"] = list(roi) if roi else None
+            print(f"Debug - Labels detected for frame {frame_idx}: {response}")
+                
+        except Exception as e:
+            response = ''
+            print(f"Debug - Exception during text detection for frame {frame_idx}: {e}")
+        
+        result = {
+            "frame_number": frame_idx,
+            "timestamp": source.timestamp(frame_idx),
+            "message": response,  # Changed from caption to labels
+            "fields": extract_fields(region_items(response.get(task_prompt, {}))) if response else None,
+        }
+        result.update(_frame_image_fields(pil_image, image_mode))
+        FRAMES_PROCESSED.inc(pipeline="authenticate")
+        yield result
+
+def _check_options(profile: str, image_mode: str):
+    if profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown decoding profile. Choose from: {', '.join(DECODING_PROFILES)}")
+    if image_mode not in IMAGE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown image mode. Choose from: {', '.join(IMAGE_MODES)}")
+
+def _check_video_filename(filename: str):
+    # Validate file extension
+    if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
+        raise HTTPException(status_code=400, detail="Unsupported video format. Please upload MP4, AVI, MOV, MKV or WEBM files.")
+
+@app.post("/api/authenticate", openapi_extra=UPLOAD_OPENAPI)
+async def authenticate_video(request: Request, profile: str = DEFAULT_PROFILE,
+                             image: str = DEFAULT_IMAGE_MODE, merged: bool = False) -> Union[List[dict], dict]:
+    """
+    Per-frame text detection results for the keyframes of a video. With
+    merged=true the response is {"frames": [...], "fields": ...}, adding the
+    medicine fields combined across all frames
+    """
     temp_path = None
     
     try:
-        # Validate file extension
-        if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-            raise HTTPException(status_code=400, detail="Unsupported video format. Please upload MP4, AVI, MOV, or MKV files.")
-
-        # Save uploaded video to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-            content = await file.read()
-            if len(content) == 0:
-                raise HTTPException(status_code=400, detail="Empty file uploaded")
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        # Open video after the file is completely written and closed
-        video = cv2.VideoCapture(temp_path)
-        
-        # More thorough video validation
-        if not video.isOpened():
-            raise HTTPException(status_code=400, detail="Could not open video file")
-            
-        fps = video.get(cv2.CAP_PROP_FPS)
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        print(f"Debug - Video properties:")
-        print(f"Debug - Path: {temp_path}")
-        print(f"Debug - Total frames: {total_frames}")
-        print(f"Debug - FPS: {fps}")
-        print(f"Debug - File size: {os.path.getsize(temp_path)} bytes")
-        
-        # More comprehensive validation
-        if total_frames <= 0 or fps <= 0:
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid video file. Please ensure the video is properly encoded and not corrupted."
-            )
-        
-        # Process frames
-        frames_to_process = [0, max(0, total_frames-1)]
-        print(f"Debug - Frames to process: {frames_to_process}")
-        
-        results = []
-        for frame_idx in frames_to_process:
-            print(f"Debug - Processing frame {frame_idx}")
-            
-            # Set video to specific frame
-            video.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = video.read()
-            
-            if not ret:
-                print(f"Debug - Failed to read frame {frame_idx}")
-                continue
-                
-            print(f"Debug - Successfully read frame {frame_idx}")
-            
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb_frame)
-            
-            temp_frame_path = f"temp_frame_{frame_idx}.jpg"
-            pil_image.save(temp_frame_path, quality=65, optimize=True)
-            
-            try:
-                task_prompt = '<OCR>'
-                response = detect_text(task_prompt=task_prompt, image=pil_image)
-                print(f"Debug - Labels detected for frame {frame_idx}: {response}")
-                    
-            except Exception as e:
-                response = ''
-                print(f"Debug - Exception during text detection for frame {frame_idx}: {e}")
-            
-            # Remove temporary frame file
-            if os.path.exists(temp_frame_path):
-                os.remove(temp_frame_path)
-            
-            # Convert frame to base64
-            buffered = io.BytesIO()
-            pil_image.save(buffered, format="JPEG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            results.append({
-                "frame_number": frame_idx,
-                "frame_image": img_str,
-                "timestamp": frame_idx/fps,
-                "message": response  # Changed from caption to labels
-            })
+        _check_options(profile, image)
+
+        # Stream uploaded video to a temporary file
+        upload = await save_upload(request, check_filename=_check_video_filename)
+        temp_path = upload.path
         
-        print(f"Debug - Total results processed: {len(results)}")
+        # Identical uploads are answered from the result cache
+        cache_key = make_key(variant_id(florence_model_id), f"<OCR_WITH_REGION>|keyframes={DEFAULT_KEYFRAMES}|{profile}|{image}|{roi_key()}|fields", upload.sha256)
+        results = result_cache.get(cache_key)
+        if results is None:
+            results = await inference_executor.run(_analyze_video, temp_path, profile, image)
+            # A frame whose detection failed would otherwise be served from
+            # the cache (and its SQLite copy) until eviction. Frame URLs are
+            # not cached either: the frame store may evict the frames they
+            # point to long before the cache drops the entry
+            if image != "url" and all(result["message"] for result in results):
+                result_cache.put(cache_key, results)
+        if merged:
+            return {"frames": results, "fields": _merged_fields(results)}
         return results
     
+    except HTTPException:
+        raise
+    except InvalidVideoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except InferenceTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"Debug - Main function exception: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Clean up resources
-        if video is not None:
-            video.release()
-        # Wait a brief moment before trying to delete the file
-        import time
-        time.sleep(0.1)
+        # The capture is already released by _analyze_video
         if temp_path and os.path.exists(temp_path):
             try:
                 os.unlink(temp_path)
             except PermissionError:
-                print(f"Warning: Could not delete temporary file: {temp_path}")
\ No newline at end of file
+                print(f"Warning: Could not delete temporary file: {temp_path}")
+
+def _check_image_filename(filename: str):
+    if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+        raise HTTPException(status_code=400, detail="Unsupported image format. Please upload JPG, PNG or WEBP files.")
+
+@app.post("/api/scan", openapi_extra=UPLOAD_OPENAPI)
+async def scan_image(request: Request) -> dict:
+    """
+    Read Name, Batch Number, MRP and Expiry Date from a packaging photo with
+    the tiered OCR engine; "tier" in the response names the engine that answered
+    """
+    temp_path = None
+
+    try:
+        upload = await save_upload(request, check_filename=_check_image_filename)
+        temp_path = upload.path
+
+        cascade = f"{'>'.join(ocr_cascade.tiers)}|{ocr_cascade.min_confidence}|{ocr_cascade.min_coverage}"
+        cache_key = make_key(variant_id(florence_model_id), f"ocr-cascade|{cascade}|{roi_key()}|fields", upload.sha256)
+        result = result_cache.get(cache_key)
+        if result is None:
+            try:
+                image = Image.open(temp_path).convert("RGB")
+            except OSError:
+                raise HTTPException(status_code=400, detail="Could not read image file")
+            result = await inference_executor.run(ocr_cascade.read, image)
+            # With a tier down (e.g. Ollama unreachable) the answer may come
+            # from a weaker tier; keep it out of the cache unless it is good
+            # enough anyway, so the next scan tries the full cascade again
+            if not result["failed"] or ocr_cascade.good_enough(result):
+                result_cache.put(cache_key, result)
+        return result
+
+    except HTTPException:
+        raise
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except InferenceTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        print(f"Debug - Scan exception: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def _authenticate_job(job):
+    """Job handler: /api/authenticate analysis, reporting each frame as it is ready"""
+    for result in _iter_video_results(job.input_path, job.params["profile"],
+                                      job.params.get("image", DEFAULT_IMAGE_MODE),
+                                      on_total=job.set_total):
+        job.add_frame(result)
+
+def _pixelate_job(job):
+    """Job handler: pixelate every face in a video, reporting each written frame"""
+    from face_pixelator import FacePixelator # type: ignore
+
+    source = FrameSource(job.input_path)
+    # Browser-recorded WebM has no frame count in its header; counting the
+    # stream is cheap next to detection and gives progress a total
+    total_frames = source.frame_count if source.frame_count > 0 else source.count_frames()
+    job.set_total(total_frames if total_frames > 0 else None)
+
+    output_path = os.path.join(job.output_dir, f"{job.id}.mp4")
+    process_video_sharded(
+        FacePixelator(),
+        job.input_path,
+        output_path,
+        workers=job.params.get("workers", 1),
+        scale_factor=job.params["scale_factor"],
+        frame_rate=source.fps,
+        detect_every=job.params["detect_every"],
+        total_frames=total_frames,
+        on_frame=lambda frame_idx, face_boxes: job.add_frame({
+            "frame_number": frame_idx,
+            "face_boxes": [[float(v) for v in box] for box in face_boxes],
+        }),
+    )
+    return output_path
+
+job_manager.register("authenticate", _authenticate_job)
+job_manager.register("pixelate", _pixelate_job)
+
+async def _submit_job(kind: str, request: Request, params: dict) -> dict:
+    upload = await save_upload(request, check_filename=_check_video_filename)
+    try:
+        # Moving the upload (a copy across filesystems) and the SQLite insert block
+        job_id = await asyncio.to_thread(job_manager.submit, kind, params, upload.path)
+    except JobQueueFullError as e:
+        os.unlink(upload.path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
+
+@app.post("/api/jobs/authenticate", openapi_extra=UPLOAD_OPENAPI)
+async def create_authenticate_job(request: Request, profile: str = DEFAULT_PROFILE,
+                                  image: str = DEFAULT_IMAGE_MODE):
+    """Queue an /api/authenticate analysis and return its job id"""
+    _check_options(profile, image)
+    return await _submit_job("authenticate", request, {"profile": profile, "image": image})
+
+@app.post("/api/jobs/pixelate", openapi_extra=UPLOAD_OPENAPI)
+async def create_pixelate_job(request: Request, detect_every: int = 15, scale_factor: float = 1.0,
+                              workers: int = PIXELATE_WORKERS):
+    """Queue a face-pixelation run over a video and return its job id"""
+    if detect_every < 1 or scale_factor <= 0 or workers < 1:
+        raise HTTPException(status_code=400, detail="detect_every and workers must be >= 1 and scale_factor > 0")
+    return await _submit_job("pixelate", request, {"detect_every": detect_every, "scale_factor": scale_factor,
+                                                "workers": workers})
+
+def _job_summary(job: dict) -> dict:
+    """Status of a job; a finished authenticate job also gets its merged medicine fields"""
+    summary = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": {"frames_done": job["frames_done"], "frames_total": job["frames_total"]},
+        "error": job["error"],
+    }
+    if job["output_path"]:
+        summary["output_url"] = f"/api/jobs/{job['id']}/output"
+    if job["kind"] == "authenticate" and job["status"] == "done":
+        summary["fields"] = _merged_fields(job_manager.store.frames(job["id"]))
+    return summary
+
+def _get_job(job_id: str) -> dict:
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, since: int = 0):
+    """Job status, progress and the frame results from index `since` on"""
+    job = await asyncio.to_thread(_get_job, job_id)
+    summary = await asyncio.to_thread(_job_summary, job)
+    results = await asyncio.to_thread(job_manager.store.frames, job_id, since)
+    return {**summary, "results": results}
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, since: int = 0):
+    """Server-sent events: one `frame` event per result as it is ready, then `done` or `failed`"""
+    await asyncio.to_thread(_get_job, job_id)
+
+    async def events():
+        next_seq = since
+        while True:
+            # Read the status before the frames so no frame added before the
+            # job finished can be missed. The store's SQLite calls block, so
+            # they run off the event loop
+            job = await asyncio.to_thread(job_manager.store.get, job_id)
+            if job is None:
+                # Deleted by the finished-job cleanup
+                return
+            for frame in await asyncio.to_thread(job_manager.store.frames, job_id, next_seq):
+                next_seq = frame["seq"] + 1
+                yield f"event: frame\ndata: {json.dumps(frame)}\n\n"
+            if job["status"] in ("done", "failed"):
+                summary = await asyncio.to_thread(_job_summary, job)
+                yield f"event: {job['status']}\ndata: {json.dumps(summary)}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/jobs/{job_id}/output")
+def get_job_output(job_id: str):
+    """Download the output file of a finished job (e.g. the pixelated video)"""
+    job = _get_job(job_id)
+    if job["status"] != "done" or not job["output_path"] or not os.path.exists(job["output_path"]):
+        raise HTTPException(status_code=404, detail="Job output not available")
+    return FileResponse(job["output_path"], media_type="video/mp4", filename=f"{job_id}.mp4")
@@ -1,74 +1,217 @@
 import cv2  # type: ignore
 from PIL import Image  # type: ignore
 import json
+import sys
+from difflib import SequenceMatcher
 from typing import Dict, List
-from detect_text import detect_text
+from detect_text import detect_text_batch, DEFAULT_PROFILE, DECODING_PROFILES
+from keyframes import best_frames, read_frames, DEFAULT_KEYFRAMES
+from model_registry import INFERENCE_BACKEND
+from roi import detect_text_roi_batch, ROI_CROP
+from medicine_fields import extract_fields, field_values, merge_fields, region_items
+
+def region_text(region_result: Dict) -> str:
+    """
+    Rebuilds the plain OCR text from an <OCR_WITH_REGION> result by ordering
+    its labels top-to-bottom, then left-to-right within a line. Boxes whose
+    vertical centers are closer than half the median box height share a line.
+    Labels are concatenated without separators, like the <OCR> task output.
+    """
+    if not isinstance(region_result, dict):
+        return ""
+    boxes = region_result.get("quad_boxes", [])
+    labels = region_result.get("labels", [])
+    items = []
+    for quad, label in zip(boxes, labels):
+        xs, ys = quad[0::2], quad[1::2]
+        items.append((min(xs), (min(ys) + max(ys)) / 2, max(ys) - min(ys),
+                      label.replace("</s>", "").replace("<s>", "")))
+    if not items:
+        return ""
+
+    heights = sorted(item[2] for item in items)
+    line_tolerance = heights[len(heights) // 2] / 2
+
+    lines: List[List] = []
+    for item in sorted(items, key=lambda item: item[1]):
+        if lines and item[1] - lines[-1][-1][1] <= line_tolerance:
+            lines[-1].append(item)
+        else:
+            lines.append([item])
+    return "".join(item[3] for line in lines for item in sorted(line, key=lambda item: item[0]))
 
 class MedicineDetector:
     """
     A class for detecting and extracting text information from medicine packaging
     using Florence-2 model.
     """
+    def __init__(self, num_keyframes: int = DEFAULT_KEYFRAMES, single_pass: bool = False,
+                 decoding_profile: str = DEFAULT_PROFILE, crop_roi: bool = ROI_CROP,
+                 tile: bool = False):
+        # Number of frames per video sent to the model
+        self.num_keyframes = num_keyframes
+        # Run only <OCR_WITH_REGION> and derive full_text from its labels,
+        # halving model time per frame
+        self.single_pass = single_pass
+        # Named decoding profile ("fast", "balanced", "accurate")
+        if decoding_profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile: {decoding_profile}")
+        self.decoding_profile = decoding_profile
+        # Read only the detected label region (boxes are still reported in
+        # frame coordinates), tiling it when it is much larger than the
+        # model input
+        self.crop_roi = crop_roi
+        self.tile = tile
+
     def process_video(self, video_path: str) -> List[Dict]:
         """
-        Process only first and last frames of a video and extract medicine information
+        Process the sharpest, most text-rich distinct frames of a video and
+        extract medicine information
         """
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Error opening video file: {video_path}")
-
         results = []
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        keyframes, _ = best_frames(video_path, self.num_keyframes)
         
-        # Process first and last frames
-        frames_to_process = [0, total_frames - 1]
-        
-        for frame_num in frames_to_process:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            ret, frame = cap.read()
-            if ret:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(frame_rgb)
-                try:
-                    medicine_info = self._analyze_frame(pil_image)
-                    medicine_info['frame_number'] = frame_num
-                    results.append(medicine_info)
-                except Exception as e:
-                    print(f"Error processing frame {frame_num}: {str(e)}")
-
-        cap.release()
+        frame_numbers = []
+        images = []
+        for frame_num in sorted(keyframes):
+            frame_rgb = cv2.cvtColor(keyframes[frame_num], cv2.COLOR_BGR2RGB, dst=keyframes[frame_num])
+            frame_numbers.append(frame_num)
+            images.append(Image.fromarray(frame_rgb))
+
+        if not images:
+            return results
+
+        try:
+            frame_infos = self._analyze_frames(images)
+        except Exception as e:
+            print(f"Error processing frames {frame_numbers}: {str(e)}")
+            return results
+
+        for frame_num, medicine_info in zip(frame_numbers, frame_infos):
+            medicine_info['frame_number'] = frame_num
+            results.append(medicine_info)
+
         return results
 
+    def merged_fields(self, results: List[Dict]) -> Dict:
+        """
+        One set of medicine fields for a video from the per-frame results of
+        process_video, with the evidence of all frames combined
+        """
+        return merge_fields([result["fields"] for result in results],
+                            [result["frame_number"] for result in results])
+
     def _analyze_frame(self, image) -> Dict:
         """
         Analyzes a single frame to get all visible text and a summary
         """
-        result = {
+        return self._analyze_frames([image])[0]
+
+    def _detect(self, task_prompt: str, images: List) -> List[Dict]:
+        if self.crop_roi:
+            return detect_text_roi_batch(task_prompt, images, profile=self.decoding_profile, tile=self.tile)
+        return detect_text_batch(task_prompt, images, profile=self.decoding_profile)
+
+    def _analyze_frames(self, images: List) -> List[Dict]:
+        """
+        Analyzes several frames, running each prompt once over the whole batch.
+        Each result's "fields" holds the medicine fields parsed from its
+        <OCR_WITH_REGION> boxes (see medicine_fields.extract_fields).
+        """
+        results = [{
             "full_text": "",
             "summary": "",
             "frame_number": 0
-        } 
+        } for _ in images]
+
+        # Get a structured summary - simplified prompt
+        summary_prompt = "<OCR_WITH_REGION>"
+        summary_results = self._detect(summary_prompt, images)
+
+        if self.single_pass:
+            for result, summary_result in zip(results, summary_results):
+                result["summary"] = summary_result.get("<OCR_WITH_REGION>", "")
+                result["full_text"] = region_text(result["summary"])
+                result["fields"] = extract_fields(region_items(result["summary"]))
+            return results
 
         # Get all text using OCR - simplified prompt
         full_text_prompt = "<OCR>"
-        ocr_result = detect_text(full_text_prompt, image=image)
-        result["full_text"] = ocr_result.get("<OCR>", "")
+        ocr_results = self._detect(full_text_prompt, images)
 
-        # Get a structured summary - simplified prompt
-        summary_prompt = "<OCR_WITH_REGION>"
-        summary_result = detect_text(summary_prompt, image=image)
-        result["summary"] = summary_result.get("<OCR_WITH_REGION>", "")
+        for result, ocr_result, summary_result in zip(results, ocr_results, summary_results):
+            result["full_text"] = ocr_result.get("<OCR>", "")
+            result["summary"] = summary_result.get("<OCR_WITH_REGION>", "")
+            result["fields"] = extract_fields(region_items(result["summary"]))
 
-        return result
+        return results
+
+def check_reference_accuracy(video_path: str, reference_path: str = "medicine_detection_results.json",
+                             min_similarity: float = 0.8) -> Dict:
+    """
+    Accuracy-regression check for the inference backend (e.g. FLORENCE_BACKEND=int8).
+    Re-analyzes the frames recorded in reference_path (fp32 output of the
+    default two-call, accurate-profile detector) and compares full_text and
+    region labels with the recorded ones. A frame passes when both texts are
+    at least min_similarity similar (difflib ratio, 0..1) and, if the
+    reference recorded "fields", at least min_similarity of its non-empty
+    field values are read again.
+    """
+    with open(reference_path) as f:
+        reference = json.load(f)
+
+    frames = read_frames(video_path, [entry["frame_number"] for entry in reference])
+    # The reference was recorded on whole frames
+    detector = MedicineDetector(crop_roi=False)
+    report = {"backend": INFERENCE_BACKEND, "frames": [], "passed": True}
+    for entry in reference:
+        frame = frames.get(entry["frame_number"])
+        if frame is None:
+            raise ValueError(f"Frame {entry['frame_number']} not found in {video_path}")
+        actual = detector._analyze_frame(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        text_similarity = SequenceMatcher(None, entry["full_text"], actual["full_text"]).ratio()
+        expected_labels = "\n".join(entry["summary"].get("labels", []))
+        actual_labels = "\n".join(actual["summary"].get("labels", []))
+        label_similarity = SequenceMatcher(None, expected_labels, actual_labels).ratio()
+        passed = text_similarity >= min_similarity and label_similarity >= min_similarity
+        frame_report = {
+            "frame_number": entry["frame_number"],
+            "text_similarity": round(text_similarity, 3),
+            "label_similarity": round(label_similarity, 3),
+        }
+        expected_fields = {name: value for name, value in field_values(entry.get("fields") or {}).items()
+                           if value is not None}
+        if expected_fields:
+            actual_fields = field_values(actual["fields"])
+            matched = sum(actual_fields.get(name) == value for name, value in expected_fields.items())
+            field_accuracy = matched / len(expected_fields)
+            passed = passed and field_accuracy >= min_similarity
+            frame_report["field_accuracy"] = round(field_accuracy, 3)
+        frame_report["passed"] = passed
+        report["passed"] = report["passed"] and passed
+        report["frames"].append(frame_report)
+    return report
 
 def main():
-    """Example usage"""
+    """
+    Example usage: python medicine_detector.py [--check-reference] [video_path]
+    (default medicine_video.mp4). Pass --check-reference to compare the
+    current backend with the recorded fp32 results (exits non-zero on a
+    regression).
+    """
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    video_path = paths[0] if paths else "medicine_video.mp4"
+    if "--check-reference" in sys.argv:
+        report = check_reference_accuracy(video_path)
+        print(json.dumps(report, indent=4))
+        sys.exit(0 if report["passed"] else 1)
+
     detector = MedicineDetector()
-    video_path = "medicine_video.mp4"
     results = detector.process_video(video_path)
     
     with open("medicine_detection_results.json", 'w') as f:
         json.dump(results, f, indent=4)
+    print(json.dumps(detector.merged_fields(results), indent=4))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
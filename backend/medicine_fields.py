@@ -0,0 +1,313 @@
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Fields read off medicine packaging, as in ocr.OCR_FIELDS
+FIELDS = ("Name", "Quantity", "Batch Number", "MRP", "Expiry Date")
+
+# Confidence of a value by how it was found
+LABELED_INLINE = 0.9    # value follows its label in the same line
+LABELED_NEARBY = 0.75   # value in the box right of or below its label
+UNIT_COUNT = 0.7        # quantity pattern such as "10 Tablets" or "1 x 10's"
+UNLABELED = 0.5         # date with no label, e.g. the later of two dates
+
+_MONTHS = {name: i + 1 for i, name in enumerate(
+    ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"))}
+
+# Field labels; each match's value is the text up to the next label in the line
+LABEL_RE = re.compile("|".join((
+    r"(?P<batch>\b(?:B\.?\s*No|Batch\s*(?:No|Number)?|Lot\s*(?:No)?|B/N)\b\.?)",
+    r"(?P<mrp>(?:\bM\.?\s*R\.?\s*P\b\.?|\bPrice\b)(?:\s*(?:Rs\b\.?|₹|INR\b))?|\bRs\b\.?|₹|\bINR\b)",
+    r"(?P<expiry>\b(?:Exp(?:iry)?\b\.?\s*(?:Date|Dt)?|Use\s*before|Best\s*before)\b\.?)",
+    r"(?P<mfg>\b(?:Mfg|Mfd|Manufactured|Mfg\.?\s*Lic)\b\.?\s*(?:Date|Dt)?\.?)",
+)), re.I)
+_LABEL_FIELDS = {"batch": "Batch Number", "mrp": "MRP", "expiry": "Expiry Date"}
+
+BATCH_VALUE_RE = re.compile(r"^[\s:.\-#]*([A-Z0-9][A-Z0-9\-/]{2,14})\b", re.I)
+PRICE_VALUE_RE = re.compile(r"^[^0-9]{0,25}?(\d{1,3}(?:,\d{2,3})+|\d+)(?:\.(\d{1,2}))?")
+DATE_VALUE_RE = re.compile(
+    r"\b(?:(?P<day>\d{1,2})[/\-.](?=\d{1,2}[/\-.]\d{2,4}))?(?P<month>\d{1,2})[/\-.](?P<year>\d{4}|\d{2})\b"
+    r"|\b(?P<mon>JAN|FEB|MAR|APR|MAY|JUNE?|JULY?|AUG|SEPT?|OCT|NOV|DEC)[A-Z]*\.?[\s/\-.,']*(?P<myear>\d{4}|\d{2})\b",
+    re.I)
+QUANTITY_RE = re.compile(
+    r"\b(?:(?P<packs>\d{1,3})\s*[xX×]\s*)?(?P<count>\d{1,4})\s*(?:'?s\b|(?:Tablets?|Tabs?|Capsules?|Caps?|Softgels?"
+    r"|Sachets?|Vials?|Ampoules?|Strips?|Bottles?)\b)"
+    r"|\b(?:Strip|Pack|Box)\s+of\s+(?P<of>\d{1,4})\b", re.I)
+# Lines that are labels or boilerplate, never the product name
+_NOT_NAME_RE = re.compile(r"\b(?:Lic|Marketed|Composition|Each|Store|Dosage|Schedule|Warning|Keep)\b", re.I)
+
+Box = Tuple[float, float, float, float]
+
+
+def parse_date(text: str) -> Optional[str]:
+    """First plausible date in text as "YYYY-MM" (or "YYYY-MM-DD" if it has a day), else None."""
+    for match in DATE_VALUE_RE.finditer(text):
+        if match.group("mon"):
+            month, year, day = _MONTHS[match.group("mon").upper()[:3]], match.group("myear"), None
+        else:
+            month, year, day = int(match.group("month")), match.group("year"), match.group("day")
+        year = int(year) + (2000 if len(year) == 2 else 0)
+        if not month or not 1 <= month <= 12 or not 2000 <= year <= 2099:
+            continue
+        if day is not None:
+            if not 1 <= int(day) <= 31:
+                continue
+            return f"{year:04d}-{month:02d}-{int(day):02d}"
+        return f"{year:04d}-{month:02d}"
+    return None
+
+
+def parse_price(text: str) -> Optional[float]:
+    """Leading price in text ("Rs. 1,250.00", ": 45/-") as a float, else None."""
+    match = PRICE_VALUE_RE.match(text)
+    if not match or QUANTITY_RE.match(text, match.start(1)):
+        return None
+    price = float(match.group(1).replace(",", "") + "." + (match.group(2) or "0"))
+    return price if 0 < price < 100000 else None
+
+
+def parse_batch(text: str) -> Optional[str]:
+    """Leading batch code in text (upper case, at least one digit), else None."""
+    match = BATCH_VALUE_RE.match(text)
+    if not match or not any(c.isdigit() for c in match.group(1)):
+        return None
+    return match.group(1).upper().strip("-/")
+
+
+def parse_quantity(text: str) -> Optional[int]:
+    """Unit count in text ("10 Tablets", "1 x 10's", "Strip of 15"), else None."""
+    match = QUANTITY_RE.search(text)
+    if not match:
+        return None
+    if match.group("of"):
+        return int(match.group("of"))
+    count = int(match.group("count")) * int(match.group("packs") or 1)
+    return count or None
+
+
+_PARSERS = {"Batch Number": parse_batch, "MRP": parse_price, "Expiry Date": parse_date}
+
+
+class _Piece:
+    __slots__ = ("box", "text", "line")
+
+    def __init__(self, box: Optional[Box], text: str):
+        self.box = box
+        self.text = text
+        self.line = -1
+
+
+class BoxIndex:
+    """
+    Text pieces sorted by vertical center, for finding the piece right of
+    or below a label without scanning every piece.
+    """
+    def __init__(self, pieces: List[_Piece]):
+        self.pieces = sorted((piece for piece in pieces if piece.box), key=lambda piece: _center_y(piece.box))
+        self._centers = [_center_y(piece.box) for piece in self.pieces]
+
+    def _between(self, low: float, high: float) -> List[_Piece]:
+        return self.pieces[bisect.bisect_left(self._centers, low):bisect.bisect_right(self._centers, high)]
+
+    def neighbours(self, box: Box) -> List[_Piece]:
+        """
+        Pieces right of box on the same row, then pieces below it that overlap
+        it horizontally, each nearest first.
+        """
+        x1, y1, x2, y2 = box
+        height = y2 - y1
+        right = [piece for piece in self._between(y1, y2)
+                 if piece.box[0] >= x2 - height * 0.5 and piece.box[0] - x2 < height * 8]
+        below = [piece for piece in self._between(y2, y2 + height * 2.5)
+                 if piece.box[1] >= y2 - height * 0.3 and min(x2, piece.box[2]) > max(x1, piece.box[0])]
+        return (sorted(right, key=lambda piece: piece.box[0])
+                + sorted(below, key=lambda piece: piece.box[1]))
+
+
+def _center_y(box: Box) -> float:
+    return (box[1] + box[3]) / 2
+
+
+def _clean(text: str) -> str:
+    return text.replace("</s>", "").replace("<s>", "").strip()
+
+
+def _group_lines(pieces: List[_Piece]) -> List[List[_Piece]]:
+    """
+    Pieces with boxes grouped into lines, top to bottom and left to right.
+    Like medicine_detector.region_text, pieces whose vertical centers are
+    within half the median box height share a line; pieces without boxes
+    are one line each.
+    """
+    boxed = [piece for piece in pieces if piece.box]
+    if not boxed:
+        return [[piece] for piece in pieces]
+    heights = sorted(piece.box[3] - piece.box[1] for piece in boxed)
+    tolerance = heights[len(heights) // 2] / 2
+    lines: List[List[_Piece]] = []
+    for piece in sorted(boxed, key=lambda piece: _center_y(piece.box)):
+        if lines and _center_y(piece.box) - _center_y(lines[-1][-1].box) <= tolerance:
+            lines[-1].append(piece)
+        else:
+            lines.append([piece])
+    return [sorted(line, key=lambda piece: piece.box[0]) for line in lines]
+
+
+def _evidence(value, confidence: float, source: str) -> Dict:
+    return {"value": value, "confidence": confidence, "source": source}
+
+
+def extract_fields(items: Iterable[Tuple[Optional[Sequence[float]], str]]) -> Dict[str, Optional[Dict]]:
+    """
+    Reads FIELDS from OCR text pieces, each a (flat x,y polygon, text) pair;
+    the polygon may be None for text without positions (one piece per line).
+
+    Labels ("B.No.", "MRP", "Exp.", ...) are found with one compiled pattern
+    per line; a label's value is the text that follows it up to the next
+    label, or, if that does not parse, the nearest box right of or below the
+    label. Values are normalized: dates to "YYYY-MM[-DD]", MRP to a float,
+    Quantity to an int, batch codes to upper case. Quantity needs no label,
+    and an unlabeled date other than the mfg date is taken as the expiry
+    when none is labeled. The name is the tallest line that holds no label.
+
+    Returns {field: {"value", "confidence", "source"} or None}.
+    """
+    pieces = []
+    for polygon, text in items:
+        text = _clean(text)
+        if not text:
+            continue
+        box = None
+        if polygon:
+            xs, ys = polygon[0::2], polygon[1::2]
+            box = (min(xs), min(ys), max(xs), max(ys))
+        pieces.append(_Piece(box, text))
+    lines = _group_lines(pieces)
+    for number, line in enumerate(lines):
+        for piece in line:
+            piece.line = number
+    index = BoxIndex(pieces)
+
+    fields: Dict[str, Optional[Dict]] = {name: None for name in FIELDS}
+    labeled_lines = set()
+    mfg_dates = set()
+    for number, line in enumerate(lines):
+        # Character offset of each piece in the joined line text, and the
+        # offsets where a wide gap separates a piece from the previous one
+        # (a value does not continue across a gap into another column)
+        starts, gaps, text = [], [], ""
+        for previous, piece in zip([None] + line[:-1], line):
+            if previous is not None and piece.box and previous.box and \
+                    piece.box[0] - previous.box[2] > 1.5 * (piece.box[3] - piece.box[1]):
+                gaps.append(len(text))
+            starts.append(len(text))
+            text += piece.text + " "
+        matches = list(LABEL_RE.finditer(text))
+        if matches:
+            labeled_lines.add(number)
+        for i, match in enumerate(matches):
+            kind = match.lastgroup
+            value_end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            value_end = min([value_end] + [gap for gap in gaps if gap >= match.end()])
+            value_text = text[match.end():value_end]
+            if kind == "mfg":
+                mfg_date = parse_date(value_text)
+                if mfg_date:
+                    mfg_dates.add(mfg_date)
+                continue
+            name = _LABEL_FIELDS[kind]
+            if fields[name] is not None and fields[name]["confidence"] >= LABELED_INLINE:
+                continue
+            value = _PARSERS[name](value_text)
+            if value is not None:
+                fields[name] = _evidence(value, LABELED_INLINE, text[match.start():match.end() + len(value_text)].strip())
+                continue
+            label_piece = line[bisect.bisect_right(starts, match.start()) - 1]
+            if label_piece.box is None or fields[name] is not None:
+                continue
+            for neighbour in index.neighbours(label_piece.box):
+                if neighbour is label_piece or neighbour.line == number and neighbour.box[0] < label_piece.box[2]:
+                    continue
+                value = _PARSERS[name](neighbour.text)
+                if value is not None:
+                    fields[name] = _evidence(value, LABELED_NEARBY, f"{match.group().strip()} {neighbour.text}")
+                    break
+
+    line_texts = [" ".join(piece.text for piece in line) for line in lines]
+    full_text = "\n".join(line_texts)
+    if fields["Expiry Date"] is None:
+        # Of the unlabeled dates, the latest one that is not the mfg date
+        dates = {parse_date(match.group()) for match in DATE_VALUE_RE.finditer(full_text)} - mfg_dates - {None}
+        if dates:
+            fields["Expiry Date"] = _evidence(max(dates), UNLABELED, max(dates))
+    quantity_line = next((line for line in line_texts if parse_quantity(line)), None)
+    if quantity_line is not None:
+        fields["Quantity"] = _evidence(parse_quantity(quantity_line), UNIT_COUNT, quantity_line)
+
+    names = []
+    for number, (line, text) in enumerate(zip(lines, line_texts)):
+        if number in labeled_lines or _NOT_NAME_RE.search(text) or sum(c.isalpha() for c in text) < 3:
+            continue
+        height = max((piece.box[3] - piece.box[1] for piece in line if piece.box), default=0.0)
+        names.append((height, -number, text))
+    if names:
+        names.sort(reverse=True)
+        height, _, text = names[0]
+        if height > 0:
+            # Confident when the name stands out in size from the next line
+            runner_up = names[1][0] if len(names) > 1 else 0.0
+            confidence = 0.4 + 0.5 * (1 - runner_up / height)
+        else:
+            confidence = 0.3
+        fields["Name"] = _evidence(text, round(confidence, 3), text)
+    return fields
+
+
+def region_items(region_result: Dict) -> List[Tuple[List[float], str]]:
+    """(polygon, text) pairs of a Florence-2 <OCR_WITH_REGION> result."""
+    if not isinstance(region_result, dict):
+        return []
+    return list(zip(region_result.get("quad_boxes", []), region_result.get("labels", [])))
+
+
+def text_items(text: str) -> List[Tuple[None, str]]:
+    """Position-less pieces of plain OCR text (e.g. a Florence-2 <OCR> result), one per line."""
+    return [(None, line) for line in text.splitlines() if line.strip()]
+
+
+def merge_fields(frames: List[Dict[str, Optional[Dict]]],
+                 frame_numbers: Optional[List[int]] = None) -> Dict[str, Optional[Dict]]:
+    """
+    Combines the extract_fields results of several frames of one package.
+    Per field, frames that agree on a value pool their confidences
+    (1 - product of (1 - c)); the best supported value wins, discounted by
+    the pooled confidence of the values that disagree with it. Each field
+    also lists the frames that support its value.
+    """
+    if frame_numbers is None:
+        frame_numbers = list(range(len(frames)))
+    merged: Dict[str, Optional[Dict]] = {}
+    for name in FIELDS:
+        support: Dict = {}
+        for number, fields in zip(frame_numbers, frames):
+            found = fields.get(name)
+            if not found:
+                continue
+            doubt, supporters = support.get(found["value"], (1.0, []))
+            support[found["value"]] = (doubt * (1 - found["confidence"]), supporters + [number])
+        if not support:
+            merged[name] = None
+            continue
+        value, (doubt, supporters) = min(support.items(), key=lambda item: (item[1][0], -len(item[1][1])))
+        against = 1.0
+        for other, (other_doubt, _) in support.items():
+            if other != value:
+                against *= other_doubt
+        confidence = (1 - doubt) * (1 - (1 - against) / 2)
+        merged[name] = {"value": value, "confidence": round(confidence, 3), "frames": supporters}
+    return merged
+
+
+def field_values(fields: Dict[str, Optional[Dict]]) -> Dict:
+    """The plain {field: value or None} view of extract_fields or merge_fields output."""
+    return {name: (found["value"] if found else None) for name, found in fields.items()}
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or 0 if it cannot be read."""
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _param_bytes(obj) -> int:
+    """Bytes held by torch parameters/buffers of obj (or of the models in a tuple)."""
+    if isinstance(obj, (tuple, list)):
+        return sum(_param_bytes(item) for item in obj)
+    total = 0
+    for attr in ("parameters", "buffers"):
+        tensors = getattr(obj, attr, None)
+        if callable(tensors):
+            try:
+                total += sum(t.numel() * t.element_size() for t in tensors())
+            except TypeError:
+                pass
+    return total
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded models.
+
+    Each model is registered under a name with a zero-argument loader. The
+    loader runs the first time the model is requested, and every later caller
+    gets the same instance. Loads of different models can proceed in parallel;
+    concurrent requests for the same model wait for a single load.
+    """
+    def __init__(self):
+        self._loaders: Dict[str, Callable] = {}
+        self._models: Dict[str, object] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Loaded models carry over into a forked worker; locks held by
+        # threads that did not come along are replaced
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self._locks}
+
+    def register(self, name: str, loader: Callable, replace: bool = False):
+        """Register a loader for name. Existing registrations are kept unless replace is set."""
+        with self._lock:
+            if name in self._loaders and not replace:
+                return
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            if replace:
+                self._models.pop(name, None)
+                self._stats.pop(name, None)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str, loader: Optional[Callable] = None):
+        """
+        Return the model registered as name, loading it on first use.
+        If loader is given and name is not registered yet, it is registered first.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if loader is not None:
+            self.register(name, loader)
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model: {name}")
+            lock = self._locks[name]
+            loader = self._loaders[name]
+
+        with lock:
+            if name in self._models:
+                return self._models[name]
+            rss_before = current_rss()
+            start = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_bytes": max(0, current_rss() - rss_before),
+                "param_bytes": _param_bytes(model),
+            }
+            self._models[name] = model
+            print(f"Loaded model {name} in {load_seconds:.1f}s")
+            return model
+
+    def prewarm(self, names: Optional[Iterable[str]] = None):
+        """Load the given models (all registered models by default) ahead of the first request."""
+        for name in (list(self._loaders) if names is None else names):
+            self.get(name)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Load state, load time and memory footprint per registered model."""
+        return {
+            name: {"loaded": name in self._models, **self._stats.get(name, {})}
+            for name in self._loaders
+        }
+
+
+registry = ModelRegistry()
+
+# CPU inference backend for Florence-2 (FLORENCE_BACKEND): "fp32" runs the
+# checkpoint as is, "int8" applies dynamic int8 quantization to its Linear layers
+INFERENCE_BACKEND = os.environ.get("FLORENCE_BACKEND", "fp32")
+if INFERENCE_BACKEND not in ("fp32", "int8"):
+    raise ValueError(f"Unknown FLORENCE_BACKEND: {INFERENCE_BACKEND}")
+
+
+def variant_id(model_id: str) -> str:
+    """
+    Identifier of a model as served by this process's backend, for cache keys.
+    fp32 keeps the plain model id so existing cache entries stay valid.
+    """
+    return model_id if INFERENCE_BACKEND == "fp32" else f"{model_id}@{INFERENCE_BACKEND}"
+
+
+_threads_configured = False
+
+
+def configure_torch_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None):
+    """
+    Set the torch thread pools for this worker, once. Defaults come from
+    TORCH_INTRA_OP_THREADS / TORCH_INTER_OP_THREADS; unset leaves torch's own
+    choice. The inter-op pool can only be sized before torch first uses it,
+    so this runs from the startup hook and again (as a no-op) on model load.
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    import torch  # type: ignore
+    intra_op = intra_op or int(os.environ.get("TORCH_INTRA_OP_THREADS", "0"))
+    inter_op = inter_op or int(os.environ.get("TORCH_INTER_OP_THREADS", "0"))
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            print(f"Warning: could not set inter-op threads: {e}")
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every nn.Linear (weights int8, activations quantized per batch)."""
+    import torch  # type: ignore
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_florence(model_id: str, cache_dir: Optional[str] = None):
+    """Load a Florence-2 checkpoint on CPU with the configured backend. Returns (model, processor)."""
+    from transformers import AutoModelForCausalLM, AutoProcessor  # type: ignore
+    configure_torch_threads()
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        cache_dir=cache_dir,
+        device_map=None,
+        trust_remote_code=True
+    ).to('cpu').eval()
+    if INFERENCE_BACKEND == "int8":
+        model = quantize_int8(model)
+    processor = AutoProcessor.from_pretrained(
+        model_id,
+        cache_dir=cache_dir,
+        trust_remote_code=True
+    )
+    return model, processor
+
+
+def get_florence(model_id: str, cache_dir: Optional[str] = None):
+    """Shared (model, processor) pair for a Florence-2 checkpoint."""
+    return registry.get(model_id, lambda: load_florence(model_id, cache_dir))
+
+
+def _load_easyocr():
+    import easyocr  # type: ignore
+    return easyocr.Reader(['en'])  # for English only
+
+
+registry.register("easyocr-en", _load_easyocr)
@@ -1,6 +1,24 @@
+import asyncio
 import base64
+import json
+import os
+import random
+import re
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional, Union
+
+import httpx # type: ignore
+import numpy as np # type: ignore
 from PIL import Image # type: ignore
-import ollama # type: ignore
+from frame_store import encode_jpeg
+from roi import crop_to_text, ROI_CROP
+from result_cache import result_cache, image_hash, make_key
+
+OCR_MODEL = os.environ.get('OCR_MODEL', 'llama3.2-vision:11b')
+# Llama 3.2-Vision works on 560px tiles, at most 2x2 of them; larger images
+# are downscaled by the model anyway, so there is no point sending them
+OCR_MAX_IMAGE_SIZE = int(os.environ.get('OCR_MAX_IMAGE_SIZE', '1120'))
 
 SYSTEM_PROMPT = """
 You are a highly skilled AI with expertise in Optical Character Recognition (OCR) and information extraction from images of medicine packaging. You will be provided with an image of medicine packaging containing essential details such as Name, Quantity, Batch Number, MRP, and Expiry Date. 
@@ -31,22 +49,256 @@ Please be thorough and provide the most accurate extraction possible from the im
 
 """
 
-def encode_image_to_base64(image_path):
-    """Convert an image file to a base64 encoded string."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-def perform_ocr(image_path):
-    """Perform OCR on the given image using Llama 3.2-Vision."""
-    base64_image = encode_image_to_base64(image_path)
-    response = ollama.chat(
-        model='llama3.2-vision:11b',
-            messages=[{
-                'role': 'user',
-                'content': SYSTEM_PROMPT,
-                'images': [base64_image]
-            }],
+# Fields the model is asked for, and the JSON schema its reply is constrained to
+OCR_FIELDS = ("Name", "Quantity", "Batch Number", "MRP", "Expiry Date")
+OCR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Name": {"type": ["string", "null"]},
+        "Quantity": {"type": ["integer", "null"]},
+        "Batch Number": {"type": ["string", "null"]},
+        "MRP": {"type": ["number", "null"]},
+        "Expiry Date": {"type": ["string", "null"]},
+    },
+    "required": list(OCR_FIELDS),
+}
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class OCRError(Exception):
+    """Raised when the OCR server cannot be reached or keeps failing."""
+
+
+class OCRResponseError(OCRError):
+    """Raised when the model's reply is not the expected JSON object."""
+
+
+def prepare_image(image: Union[str, Image.Image, np.ndarray], max_size: int = OCR_MAX_IMAGE_SIZE,
+                  roi: bool = ROI_CROP) -> Image.Image:
+    """
+    Load image (a file path, PIL image or RGB numpy array) as an RGB PIL image
+    no larger than max_size on its longest side, cropped to its text region
+    if roi is set.
+    """
+    if isinstance(image, str):
+        image = Image.open(image)
+    elif isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if roi:
+        image, _ = crop_to_text(image)
+    if max(image.size) > max_size:
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.BICUBIC)
+    return image
+
+
+def _to_number(value, kind):
+    """value as kind, taking the first number out of strings like "Rs. 150.00"."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return kind(value)
+    match = _NUMBER.search(str(value))
+    if match is None:
+        return None
+    return kind(float(match.group().replace(",", ".")))
+
+
+def parse_fields(content: str) -> Dict:
+    """
+    Parse the model's reply into the OCR_FIELDS dict. Quantity and MRP are
+    coerced to numbers (None if absent); the other fields are stripped strings
+    or None. Raises OCRResponseError for anything that is not a JSON object.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise OCRResponseError(f"OCR reply is not JSON: {content!r:.200}") from e
+    if not isinstance(data, dict):
+        raise OCRResponseError(f"OCR reply is not a JSON object: {content!r:.200}")
+
+    fields = {}
+    for name in OCR_FIELDS:
+        value = data.get(name)
+        if name == "Quantity":
+            value = _to_number(value, int)
+        elif name == "MRP":
+            value = _to_number(value, float)
+        elif value is not None:
+            value = str(value).strip() or None
+        fields[name] = value
+    return fields
+
+
+class OllamaOCRClient:
+    """
+    Async client for the Ollama chat API with a persistent connection pool.
+
+    At most max_concurrency requests are in flight at once; the rest wait.
+    Connection errors, timeouts, 429 and 5xx replies are retried up to retries
+    times with jittered exponential backoff. The HTTP client is created on
+    first use, so the object can be built at import time; transport can be
+    given to talk to a stub (e.g. httpx.MockTransport) instead of a server.
+    """
+    def __init__(self, base_url: str = "http://127.0.0.1:11434", model: str = OCR_MODEL,
+                 max_concurrency: int = 2, timeout: float = 120.0, retries: int = 2,
+                 backoff: float = 0.5, keep_alive: str = "30m",
+                 max_image_size: int = OCR_MAX_IMAGE_SIZE, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive
+        self.max_image_size = max_image_size
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    def _payload(self, image: Image.Image) -> Dict:
+        return {
+            "model": self.model,
+            "stream": False,
+            # Keep the model resident between scans instead of reloading it
+            "keep_alive": self.keep_alive,
+            "format": OCR_SCHEMA,
+            "options": {"temperature": 0},
+            # The fixed instructions go first so the server can reuse their
+            # prompt cache; only the image differs between calls
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": "Extract the fields from this medicine packaging as JSON.",
+                    "images": [base64.b64encode(encode_jpeg(image, quality=90)).decode("ascii")],
+                },
+            ],
+        }
+
+    async def _post(self, payload: Dict) -> Dict:
+        client = self._http()
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.post("/api/chat", json=payload)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise OCRError(f"OCR server returned {response.status_code}: {response.text[:200]}")
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, OCRError) as e:
+                if attempt == self.retries:
+                    raise OCRError(f"OCR request failed after {attempt + 1} attempts: {e}") from e
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"Debug - OCR request failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def extract(self, image: Union[str, Image.Image, np.ndarray]) -> Dict:
+        """Medicine fields (see OCR_FIELDS) read from image, cached by image content."""
+        image = prepare_image(image, self.max_image_size)
+        key = make_key(self.model, f"{SYSTEM_PROMPT}|{self.max_image_size}", image_hash(image))
+        fields = result_cache.get(key)
+        if fields is None:
+            reply = await self._post(self._payload(image))
+            fields = parse_fields(reply.get("message", {}).get("content"))
+            result_cache.put(key, fields)
+        return fields
+
+
+def client_from_env() -> OllamaOCRClient:
+    """
+    Build the OCR client from environment variables:
+        OLLAMA_HOST          server URL (default http://127.0.0.1:11434)
+        OCR_CONCURRENCY      requests in flight at once (default 2)
+        OCR_TIMEOUT          seconds per request (default 120)
+        OCR_RETRIES          retries after a failed request (default 2)
+    """
+    host = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+    if "://" not in host:
+        host = f"http://{host}"
+    return OllamaOCRClient(
+        base_url=host,
+        max_concurrency=int(os.environ.get("OCR_CONCURRENCY", "2")),
+        timeout=float(os.environ.get("OCR_TIMEOUT", "120")),
+        retries=int(os.environ.get("OCR_RETRIES", "2")),
     )
-    return response
+
+
+ocr_client = client_from_env()
+
+# ocr_client's connection pool and semaphore are bound to one event loop, so
+# every caller, async or blocking, runs its requests on this loop thread
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _client_loop() -> asyncio.AbstractEventLoop:
+    """The event loop ocr_client runs on, started on a daemon thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ocr-client", daemon=True).start()
+        return _loop
+
+
+def _after_fork():
+    # The loop thread and the parent's connections do not survive a fork
+    global _loop, _loop_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+    ocr_client._client = None
+    ocr_client._semaphore = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _submit(image: Union[str, Image.Image, np.ndarray]) -> Future:
+    return asyncio.run_coroutine_threadsafe(ocr_client.extract(image), _client_loop())
+
+
+async def perform_ocr_async(image: Union[str, Image.Image, np.ndarray]) -> Dict:
+    """Perform OCR on the given image (path, PIL image or RGB array) using Llama 3.2-Vision."""
+    return await asyncio.wrap_future(_submit(image))
+
+
+def perform_ocr(image: Union[str, Image.Image, np.ndarray]) -> Dict:
+    """Blocking variant of perform_ocr_async for scripts and worker threads."""
+    return _submit(image).result()
+
+
+def shutdown_ocr_client():
+    """Close ocr_client's connections and stop the loop it runs on."""
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(ocr_client.aclose(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
 
 # if __name__ == "__main__":
 #     image_path = "/home/vipul/projects/document_scanner/backend/temp_frame_120.jpg"  # Replace with your image path
@@ -0,0 +1,116 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+from model_registry import registry
+from detect_text import DEFAULT_PROFILE
+from roi import detect_text_roi_batch
+from ocr import perform_ocr
+from medicine_fields import extract_fields, field_values, region_items
+
+# Tiers in escalation order: cheapest first
+TIERS = ("easyocr", "florence", "llm")
+# Fields a tier has to find for its answer to be accepted
+REQUIRED_FIELDS = ("Name", "Batch Number", "MRP", "Expiry Date")
+
+
+def coverage(fields: Dict, required=REQUIRED_FIELDS) -> float:
+    """Fraction of the required fields that were found."""
+    return sum(fields.get(name) is not None for name in required) / len(required)
+
+
+class OCRCascade:
+    """
+    Reads medicine fields from an image with the cheapest OCR tier that is
+    good enough. EasyOCR runs first; Florence-2 <OCR_WITH_REGION> runs only if
+    EasyOCR's mean confidence is below min_confidence or it found fewer than
+    min_coverage of REQUIRED_FIELDS; the vision LLM runs only if Florence-2
+    falls short of min_coverage too. max_tier caps how far a scan escalates.
+
+    read() returns the answering tier's field values along with the typed
+    "fields" (value, per-field confidence and source text, see
+    medicine_fields), "tier", the tier's "confidence" (None where the engine
+    reports none), "coverage", the tiers "tried" and those of them that
+    "failed" with an error. If no tier is good enough, the answer with the
+    best coverage is returned.
+    """
+    def __init__(self, min_confidence: float = 0.6, min_coverage: float = 0.75,
+                 max_tier: str = "llm", profile: str = DEFAULT_PROFILE):
+        if max_tier not in TIERS:
+            raise ValueError(f"Unknown OCR tier: {max_tier}")
+        self.min_confidence = min_confidence
+        self.min_coverage = min_coverage
+        self.tiers = TIERS[:TIERS.index(max_tier) + 1]
+        self.profile = profile
+
+    def _easyocr(self, image: Image.Image) -> Tuple[Dict, Optional[float]]:
+        reader = registry.get("easyocr-en")
+        detections = reader.readtext(np.asarray(image))
+        items = [([v for point in box for v in point], text) for box, text, _ in detections]
+        # Mean confidence weighted by text length, so stray specks count little
+        weights = [len(text) for _, text, _ in detections]
+        confidence = (sum(conf * w for (_, _, conf), w in zip(detections, weights)) / sum(weights)
+                      if sum(weights) else 0.0)
+        confidence = round(float(confidence), 3)
+        return extract_fields(items), confidence
+
+    def _florence(self, image: Image.Image) -> Tuple[Dict, Optional[float]]:
+        answer = detect_text_roi_batch("<OCR_WITH_REGION>", [image], profile=self.profile)[0]
+        return extract_fields(region_items(answer.get("<OCR_WITH_REGION>", {}))), None
+
+    def _llm(self, image: Image.Image) -> Tuple[Dict, Optional[float]]:
+        # Runs on the shared ocr_client's loop, reusing its pooled connections
+        answer = perform_ocr(image)
+        # The model reports no confidence per field
+        return {name: ({"value": value, "confidence": None, "source": "llm"} if value is not None else None)
+                for name, value in answer.items()}, None
+
+    def good_enough(self, result: Dict) -> bool:
+        """Whether a read() result meets min_confidence and min_coverage."""
+        confident = result["confidence"] is None or result["confidence"] >= self.min_confidence
+        return confident and result["coverage"] >= self.min_coverage
+
+    def read(self, image: Image.Image) -> Dict:
+        tried: List[str] = []
+        failed: List[str] = []
+        best = None
+        for tier in self.tiers:
+            tried.append(tier)
+            try:
+                fields, confidence = getattr(self, f"_{tier}")(image)
+            except Exception as e:
+                print(f"Debug - OCR tier {tier} failed: {e}")
+                failed.append(tier)
+                continue
+            values = field_values(fields)
+            result = {**values, "fields": fields, "tier": tier, "confidence": confidence,
+                      "coverage": round(coverage(values), 3)}
+            print(f"Debug - OCR tier {tier}: coverage {result['coverage']}, confidence {confidence}")
+            if best is None or result["coverage"] > best["coverage"]:
+                best = result
+            if self.good_enough(result):
+                best = result
+                break
+        if best is None:
+            raise RuntimeError(f"All OCR tiers failed: {', '.join(tried)}")
+        best["tried"] = tried
+        best["failed"] = failed
+        return best
+
+
+def cascade_from_env() -> OCRCascade:
+    """
+    Build an OCRCascade from environment variables:
+        OCR_MIN_CONFIDENCE   EasyOCR confidence needed to stop there (default 0.6)
+        OCR_MIN_COVERAGE     fraction of required fields needed to stop (default 0.75)
+        OCR_MAX_TIER         last tier to escalate to: easyocr, florence or llm (default llm)
+    """
+    return OCRCascade(
+        min_confidence=float(os.environ.get("OCR_MIN_CONFIDENCE", "0.6")),
+        min_coverage=float(os.environ.get("OCR_MIN_COVERAGE", "0.75")),
+        max_tier=os.environ.get("OCR_MAX_TIER", "llm"),
+    )
+
+
+ocr_cascade = cascade_from_env()
@@ -0,0 +1,125 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np # type: ignore
+
+_DONE = object()
+
+
+class _Stop(Exception):
+    pass
+
+
+class FramePool:
+    """
+    Reusable frame arrays, so a decoder can write each frame into memory it
+    has used before instead of allocating a new array per frame.
+
+    next() hands out a released buffer of the requested shape, or a new one
+    if none is free. Whoever consumes a frame last gives its buffer back with
+    release() once nothing (no view of it either) is used any more; frames
+    that are never released are simply not reused. The pool therefore holds
+    at most as many buffers as were in flight at once. next() and release()
+    may be called from different threads.
+    """
+    def __init__(self):
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def next(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        shape = tuple(shape)
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    return self._free.pop(i)
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            # Buffers of another shape are not needed once frames change size
+            if self._free and (self._free[0].shape != buffer.shape or self._free[0].dtype != buffer.dtype):
+                self._free = []
+            self._free.append(buffer)
+
+
+def run_pipeline(source: Iterable, stages: List[Callable], queue_size: int = 8) -> Iterator:
+    """
+    Streams items from source through stages, each running on its own thread,
+    and yields the outputs of the last stage in source order.
+
+    Stages are connected by queues holding at most queue_size items, so a slow
+    stage applies back-pressure instead of letting frames pile up in memory.
+    An exception in the source or any stage stops the pipeline and is
+    re-raised from the generator; closing the generator early stops it too.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(q, item):
+        while True:
+            if stop.is_set():
+                raise _Stop()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(q):
+        while True:
+            if stop.is_set():
+                raise _Stop()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def produce():
+        try:
+            for item in source:
+                put(queues[0], item)
+            put(queues[0], _DONE)
+        except _Stop:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def work(fn, q_in, q_out):
+        try:
+            while True:
+                item = get(q_in)
+                if item is _DONE:
+                    put(q_out, _DONE)
+                    return
+                put(q_out, fn(item))
+        except _Stop:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=produce, name="pipeline-source", daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(target=work, args=(fn, queues[i], queues[i + 1]),
+                                        name=f"pipeline-{getattr(fn, '__name__', i)}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            try:
+                item = get(queues[-1])
+            except _Stop:
+                break
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np # type: ignore
+
+
+def image_hash(image) -> str:
+    """Content hash of a PIL image or numpy array (pixels, shape and mode)."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(image, np.ndarray):
+        array = np.ascontiguousarray(image)
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        digest.update(array.data)
+    else:
+        digest.update(f"{image.size}{image.mode}".encode())
+        digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Content hash of a file, read in chunks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(model_id: str, task_prompt: str, content_hash: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{task_prompt}\0{content_hash}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache for JSON-serializable model outputs.
+
+    Entries live in an in-process LRU bounded by total serialized size and,
+    if disk_path is set, in a SQLite file bounded the same way (least recently
+    accessed rows are evicted first). Disk hits are promoted to memory. Values
+    are stored serialized, so callers always get a fresh copy.
+    """
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_path: Optional[str] = None, max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.disk_path = disk_path
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = self._connect()
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self):
+        db = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _after_fork(self):
+        # A forked worker may inherit the lock mid-use by another thread and
+        # must not share the parent's SQLite connection, so it gets its own
+        self._lock = threading.Lock()
+        if self._db is not None:
+            self._db = self._connect()
+
+    def _remember(self, key: str, payload: str):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(payload) > self.max_memory_bytes:
+            return
+        self._memory[key] = payload
+        self._memory_bytes += len(payload)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return json.loads(payload)
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._remember(key, row[0])
+                    self._counters["disk_hits"] += 1
+                    return json.loads(row[0])
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value):
+        payload = json.dumps(value)
+        with self._lock:
+            self._remember(key, payload)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            while total > self.max_disk_bytes:
+                row = self._db.execute("SELECT key, size FROM results ORDER BY accessed LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self._db.execute("DELETE FROM results WHERE key = ?", (row[0],))
+                total -= row[1]
+                self._counters["evictions"] += 1
+
+    def get_or_compute(self, key: str, compute: Callable):
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            if self._db is not None:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+                stats["disk_entries"] = count
+                stats["disk_bytes"] = size
+        return stats
+
+
+def cache_from_env() -> ResultCache:
+    """
+    Build a ResultCache from environment variables:
+        RESULT_CACHE_MEMORY_MB   in-process tier size (default 64)
+        RESULT_CACHE_PATH        SQLite file for the disk tier, empty disables it
+                                 (default .cache/results.sqlite)
+        RESULT_CACHE_DISK_MB     disk tier size (default 512)
+    """
+    return ResultCache(
+        max_memory_bytes=int(float(os.environ.get("RESULT_CACHE_MEMORY_MB", "64")) * 1024 * 1024),
+        disk_path=os.environ.get("RESULT_CACHE_PATH", ".cache/results.sqlite") or None,
+        max_disk_bytes=int(float(os.environ.get("RESULT_CACHE_DISK_MB", "512")) * 1024 * 1024),
+    )
+
+
+# Process-wide cache shared by detect_text, perform_ocr, FacePixelator and the API
+result_cache = cache_from_env()
@@ -0,0 +1,214 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+from detect_text import detect_text_batch, DEFAULT_PROFILE
+from metrics import stage
+
+# Crop frames to the detected label region before OCR (ROI_CROP, default on)
+ROI_CROP = os.environ.get("ROI_CROP", "1") not in ("0", "false", "no")
+# Longest side of a crop sent as one image; larger labels are tiled when
+# tiling is requested. Florence-2 looks at 768x768, so much more than this
+# shrinks the text again.
+ROI_TILE_SIZE = int(os.environ.get("ROI_TILE_SIZE", "1152"))
+# find_text_region settings: width the frame is analysed at
+# (ROI_ANALYSIS_WIDTH), padding added around the region as a fraction of its
+# size (ROI_PADDING), and the limits outside which the frame is left
+# uncropped: regions covering more than ROI_MAX_AREA_FRACTION of it or
+# with a side under ROI_MIN_SIDE pixels
+ROI_ANALYSIS_WIDTH = int(os.environ.get("ROI_ANALYSIS_WIDTH", "640"))
+ROI_PADDING = float(os.environ.get("ROI_PADDING", "0.04"))
+ROI_MAX_AREA_FRACTION = float(os.environ.get("ROI_MAX_AREA_FRACTION", "0.85"))
+ROI_MIN_SIDE = int(os.environ.get("ROI_MIN_SIDE", "64"))
+
+Box = Tuple[int, int, int, int]
+
+
+def roi_key() -> str:
+    """The ROI settings that change what text is read, for result cache keys."""
+    return (f"roi={int(ROI_CROP)},{ROI_ANALYSIS_WIDTH},{ROI_PADDING},"
+            f"{ROI_MAX_AREA_FRACTION},{ROI_MIN_SIDE}")
+
+
+def find_text_region(image, analysis_width: int = ROI_ANALYSIS_WIDTH, padding: float = ROI_PADDING,
+                     max_area_fraction: float = ROI_MAX_AREA_FRACTION,
+                     min_side: int = ROI_MIN_SIDE) -> Optional[Box]:
+    """
+    Locate the densest cluster of text in a frame (PIL image or RGB array)
+    and return its (x1, y1, x2, y2) box in frame coordinates, or None when
+    cropping would not help: no text found, or the region already covers
+    most of the frame.
+
+    Works on a downscaled grey copy: thin strokes are isolated with
+    black-hat/top-hat filtering, characters are joined into lines by a
+    horizontal close, line-shaped contours are kept, and the lines are
+    grouped by dilating them; the group covering the most text wins.
+    """
+    rgb = np.asarray(image)
+    height, width = rgb.shape[:2]
+    scale = min(1.0, analysis_width / width)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    small_h, small_w = gray.shape
+
+    # Black-hat and top-hat keep strokes thinner than the kernel (dark print
+    # on a light label, or light on dark) and drop large edges such as the
+    # package outline, which would otherwise swallow the text lines
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+    strokes = np.maximum(cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel),
+                         cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel))
+    otsu, _ = cv2.threshold(strokes, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    _, binary = cv2.threshold(strokes, max(otsu, 32), 255, cv2.THRESH_BINARY)
+    joined = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3)))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    lines = np.zeros_like(binary)
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w < 8 or h < 4 or h > small_h * 0.25 or w < h:
+            continue
+        if cv2.countNonZero(binary[y:y + h, x:x + w]) < 0.3 * w * h:
+            continue
+        lines[y:y + h, x:x + w] = 255
+    if not lines.any():
+        return None
+
+    reach = max(3, small_w // 25)
+    grouped = cv2.dilate(lines, cv2.getStructuringElement(cv2.MORPH_RECT, (reach, reach)))
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(grouped)
+    text_area = np.bincount(labels.ravel(), weights=(lines > 0).ravel(), minlength=count)
+    text_area[0] = 0
+    best = int(text_area.argmax())
+    x, y, w, h = stats[best, :4]
+
+    pad_x, pad_y = w * padding, h * padding
+    x1 = max(0, int((x - pad_x) / scale))
+    y1 = max(0, int((y - pad_y) / scale))
+    x2 = min(width, int((x + w + pad_x) / scale))
+    y2 = min(height, int((y + h + pad_y) / scale))
+    if x2 - x1 < min_side or y2 - y1 < min_side:
+        return None
+    if (x2 - x1) * (y2 - y1) > max_area_fraction * width * height:
+        return None
+    return x1, y1, x2, y2
+
+
+def tile_boxes(box: Box, tile_size: int = ROI_TILE_SIZE, overlap: float = 0.15) -> List[Box]:
+    """
+    Split box into a grid of overlapping tiles whose longest side is at most
+    about tile_size, row by row. A box that already fits is returned as is.
+    """
+    x1, y1, x2, y2 = box
+    cols = max(1, int(np.ceil((x2 - x1) / tile_size)))
+    rows = max(1, int(np.ceil((y2 - y1) / tile_size)))
+    if cols == 1 and rows == 1:
+        return [box]
+    step_x, step_y = (x2 - x1) / cols, (y2 - y1) / rows
+    pad_x, pad_y = step_x * overlap / 2, step_y * overlap / 2
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            tiles.append((
+                max(x1, int(x1 + col * step_x - pad_x)),
+                max(y1, int(y1 + row * step_y - pad_y)),
+                min(x2, int(x1 + (col + 1) * step_x + pad_x)),
+                min(y2, int(y1 + (row + 1) * step_y + pad_y)),
+            ))
+    return tiles
+
+
+def crop_to_text(image: Image.Image) -> Tuple[Image.Image, Optional[Box]]:
+    """Crop a PIL image to its text region. Returns (image, box), box None if uncropped."""
+    with stage("roi"):
+        box = find_text_region(image)
+    if box is None:
+        return image, None
+    return image.crop(box), box
+
+
+def shift_result(answer: Dict, dx: float, dy: float) -> Dict:
+    """Move the quad_boxes and bboxes of a parsed Florence-2 answer by (dx, dy), in place."""
+    for value in answer.values():
+        if not isinstance(value, dict):
+            continue
+        if "quad_boxes" in value:
+            value["quad_boxes"] = [[v + (dx if i % 2 == 0 else dy) for i, v in enumerate(quad)]
+                                   for quad in value["quad_boxes"]]
+        if "bboxes" in value:
+            value["bboxes"] = [[box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy]
+                               for box in value["bboxes"]]
+    return answer
+
+
+def _quad_iou(a: List[float], b: List[float]) -> float:
+    ax1, ay1, ax2, ay2 = min(a[0::2]), min(a[1::2]), max(a[0::2]), max(a[1::2])
+    bx1, by1, bx2, by2 = min(b[0::2]), min(b[1::2]), max(b[0::2]), max(b[1::2])
+    inter = max(0.0, min(ax2, bx2) - max(ax1, bx1)) * max(0.0, min(ay2, by2) - max(ay1, by1))
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def merge_tiles(task_prompt: str, answers: List[Dict]) -> Dict:
+    """
+    Combine the answers of the tiles of one frame (already shifted to frame
+    coordinates). Text answers are joined in tile order; region answers are
+    concatenated, dropping a box that repeats an earlier box's label where
+    two tiles overlap.
+    """
+    merged = dict(answers[0])
+    result = answers[0].get(task_prompt)
+    if isinstance(result, str):
+        merged[task_prompt] = "\n".join(answer.get(task_prompt, "") for answer in answers)
+    elif isinstance(result, dict) and "quad_boxes" in result:
+        quads, labels = [], []
+        for answer in answers:
+            region = answer.get(task_prompt, {})
+            for quad, label in zip(region.get("quad_boxes", []), region.get("labels", [])):
+                if any(label == kept_label and _quad_iou(quad, kept) > 0.5
+                       for kept, kept_label in zip(quads, labels)):
+                    continue
+                quads.append(quad)
+                labels.append(label)
+        merged[task_prompt] = {"quad_boxes": quads, "labels": labels}
+    if "decode" in merged:
+        merged["decode"] = dict(merged["decode"], tokens_generated=sum(
+            answer.get("decode", {}).get("tokens_generated", 0) for answer in answers))
+    return merged
+
+
+def detect_text_roi_batch(task_prompt: str, images: List[Image.Image], profile: str = DEFAULT_PROFILE,
+                          tile: bool = False, tile_size: int = ROI_TILE_SIZE) -> List[Dict]:
+    """
+    detect_text_batch on the text region of each image instead of the whole
+    frame, optionally tiling large regions. Boxes in the answers are in
+    original-frame coordinates; each answer records its crop as "roi"
+    ([x1, y1, x2, y2], or None when the whole frame was used) and the number
+    of "tiles" it was read from.
+    """
+    crops, owners, offsets, rois = [], [], [], []
+    for i, image in enumerate(images):
+        with stage("roi"):
+            box = find_text_region(image)
+        rois.append(list(box) if box else None)
+        if box is None:
+            box = (0, 0, image.width, image.height)
+        for tile_box in (tile_boxes(box, tile_size) if tile else [box]):
+            crops.append(image.crop(tile_box) if tile_box != (0, 0, image.width, image.height) else image)
+            owners.append(i)
+            offsets.append(tile_box[:2])
+
+    answers = detect_text_batch(task_prompt, crops, profile=profile)
+    per_image: List[List[Dict]] = [[] for _ in images]
+    for owner, (dx, dy), answer in zip(owners, offsets, answers):
+        per_image[owner].append(shift_result(answer, dx, dy))
+
+    results = []
+    for roi, tiles in zip(rois, per_image):
+        result = merge_tiles(task_prompt, tiles) if len(tiles) > 1 else tiles[0]
+        result["roi"] = roi
+        result["tiles"] = len(tiles)
+        results.append(result)
+    return results
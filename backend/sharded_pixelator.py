@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import queue
+import traceback
+from typing import List, Optional, Tuple
+
+import cv2 # type: ignore
+from PIL import Image # type: ignore
+from face_tracking import KeyframeFaceTracker
+from frame_source import FrameSource
+from metrics import stage, FRAMES_PROCESSED
+from pipeline import FramePool
+
+# Worker processes per pixelation job (PIXELATE_WORKERS); 1 runs in-process
+PIXELATE_WORKERS = int(os.environ.get("PIXELATE_WORKERS", "1"))
+# CPU cores pinned to each worker (PIXELATE_THREADS_PER_WORKER); 0 splits
+# the cores this process may use evenly between the workers
+PIXELATE_THREADS_PER_WORKER = int(os.environ.get("PIXELATE_THREADS_PER_WORKER", "0"))
+# Shorter shards are not worth a process of their own
+PIXELATE_MIN_SHARD_FRAMES = int(os.environ.get("PIXELATE_MIN_SHARD_FRAMES", "60"))
+
+FrameRange = Tuple[int, Optional[int]]
+
+
+def frame_ranges(total_frames: int, workers: int, min_frames: int = PIXELATE_MIN_SHARD_FRAMES,
+                 align: int = 1) -> List[FrameRange]:
+    """
+    Split frames 0..total_frames into at most workers contiguous (start, stop)
+    ranges of at least min_frames each. Starts are multiples of align, so
+    shards detect on the same keyframes as a single pass would. The last
+    range is open-ended (stop None) because container frame counts are
+    only estimates.
+    """
+    shards = max(1, min(workers, total_frames // max(1, min_frames)))
+    align = max(1, align)
+    starts = sorted({(total_frames * i // shards) // align * align for i in range(shards)})
+    return [(start, stop) for start, stop in zip(starts, starts[1:] + [None])]
+
+
+def cpu_budgets(workers: int, threads_per_worker: int = PIXELATE_THREADS_PER_WORKER) -> List[List[int]]:
+    """Disjoint sets of CPU ids per worker (wrapping around if there are too few)."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    per_worker = threads_per_worker or max(1, len(cpus) // workers)
+    return [[cpus[(i * per_worker + j) % len(cpus)] for j in range(per_worker)] for i in range(workers)]
+
+
+def _pin(cpus: List[int]):
+    """Confine this process to cpus and size its thread pools to match."""
+    import torch  # type: ignore
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(len(cpus))
+    # Decoding a shard is cheap next to detection; keep OpenCV off the model's cores
+    cv2.setNumThreads(1)
+
+
+def _detect_shard(pixelator, input_video, shard: int, frame_range: FrameRange, scale_factor,
+                  detect_every: int, cpus: List[int], results):
+    """
+    Worker process body: detect faces on one frame range and send
+    ("frame", index, boxes) per frame, then ("done", shard, None), or
+    ("error", shard, traceback) if anything fails.
+    """
+    try:
+        _pin(cpus)
+        find_faces = lambda frame: pixelator.find_all_faces(Image.fromarray(frame))
+        tracker = KeyframeFaceTracker(find_faces, detect_every=detect_every)
+        start, stop = frame_range
+        pool = FramePool()
+        for frame_idx, frame in pixelator.iter_frames(input_video, scale_factor, start, stop, pool=pool):
+            face_boxes = tracker.update(frame) if detect_every > 1 else find_faces(frame)
+            pool.release(frame)
+            results.put(("frame", frame_idx, [[float(v) for v in box] for box in face_boxes]))
+        results.put(("done", shard, None))
+    except Exception:
+        results.put(("error", shard, traceback.format_exc()))
+
+
+def process_video_sharded(pixelator, input_video, output_video, workers: int = PIXELATE_WORKERS,
+                          scale_factor=1, frame_rate=30, detect_every=1, on_frame=None,
+                          min_shard_frames: int = PIXELATE_MIN_SHARD_FRAMES, total_frames: Optional[int] = None):
+    """
+    FacePixelator.process_video with face detection spread over worker
+    processes, each running one frame range pinned to its own cores.
+
+    Florence-2 is loaded before the workers are forked, so they share the
+    parent's weights copy-on-write instead of loading a copy each. The
+    parent decodes the video once more in order, pixelates each frame as
+    soon as its boxes arrive and writes it, so output order, on_frame
+    progress and the written file match a single-process run (apart from
+    each shard starting with a fresh detection). Short videos, or
+    platforms without fork, fall back to process_video. total_frames
+    defaults to the count FrameSource reports for the video.
+    """
+    if total_frames is None:
+        total_frames = FrameSource(input_video).frame_count
+    ranges = frame_ranges(max(total_frames, 0), workers, min_shard_frames, align=detect_every)
+    if len(ranges) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return pixelator.process_video(input_video, output_video, scale_factor=scale_factor,
+                                       frame_rate=frame_rate, detect_every=detect_every, on_frame=on_frame)
+
+    # Load Florence-2 here so the forked workers inherit it
+    pixelator.model
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_detect_shard, daemon=True,
+                        args=(pixelator, input_video, shard, frame_range, scale_factor,
+                              detect_every, cpus, results))
+        for shard, (frame_range, cpus) in enumerate(zip(ranges, cpu_budgets(len(ranges))))
+    ]
+    print(f"Debug - Pixelating {input_video} in {len(processes)} shards: {ranges}")
+    for process in processes:
+        process.start()
+
+    boxes = {}
+    done = set()
+
+    def receive():
+        try:
+            kind, key, value = results.get(timeout=1.0)
+        except queue.Empty:
+            for shard, process in enumerate(processes):
+                if shard not in done and not process.is_alive():
+                    raise RuntimeError(f"Pixelation shard {shard} exited with code {process.exitcode}")
+            return
+        if kind == "frame":
+            boxes[key] = value
+        elif kind == "done":
+            done.add(key)
+        else:
+            raise RuntimeError(f"Pixelation shard {key} failed:\n{value}")
+
+    out = None
+    bgr_frame = None
+    pool = FramePool()
+    try:
+        for frame_idx, frame in pixelator.iter_frames(input_video, scale_factor, pool=pool):
+            while frame_idx not in boxes:
+                if len(done) == len(processes):
+                    raise RuntimeError(f"No shard produced frame {frame_idx}")
+                receive()
+            face_boxes = boxes.pop(frame_idx)
+            with stage("pixelate"):
+                pixelated_frame = pixelator._pixelate_boxes(frame, face_boxes, inplace=True)
+            with stage("frame_write"):
+                bgr_frame = cv2.cvtColor(pixelated_frame, cv2.COLOR_RGB2BGR, dst=bgr_frame)
+                if out is None:
+                    height, width = bgr_frame.shape[:2]
+                    out = cv2.VideoWriter(str(output_video), cv2.VideoWriter_fourcc(*'mp4v'),
+                                          frame_rate, (width, height))
+                out.write(bgr_frame)
+            pool.release(pixelated_frame)
+            if on_frame is not None:
+                on_frame(frame_idx, face_boxes)
+            FRAMES_PROCESSED.inc(pipeline="pixelate")
+    finally:
+        if out is not None:
+            out.release()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        results.close()
+    print(f"Video saved as {output_video}")
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# The backend modules import each other by bare name, as they do under uvicorn
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Disable the result cache so every call reaches the (stubbed) model
+os.environ["RESULT_CACHE_MEMORY_MB"] = "0"
+os.environ["RESULT_CACHE_PATH"] = ""
+
+# Importing main opens the job database and frame store; keep them out of the tree
+_state_dir = tempfile.mkdtemp(prefix="scanner-tests-")
+os.environ.setdefault("JOBS_DIR", os.path.join(_state_dir, "jobs"))
+os.environ.setdefault("FRAME_STORE_DIR", os.path.join(_state_dir, "frames"))
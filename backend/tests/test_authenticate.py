@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+
+from fastapi.testclient import TestClient # type: ignore
+import benchmark
+import detect_text
+import main
+
+EXPECTED = {"Name": "PARACETAMOL 650", "Batch Number": "AB1234", "MRP": 30.5, "Expiry Date": "2025-12"}
+
+
+@pytest.fixture
+def video(monkeypatch, tmp_path):
+    """A synthetic clip, read by a stub that answers every frame with the benchmark label."""
+    def generate(task_prompt, text_input, images, profile):
+        return [benchmark.stub_answer(task_prompt, image.width, image.height) for image in images]
+    monkeypatch.setattr(detect_text, "_generate_batch", generate)
+    with open(benchmark.make_video(str(tmp_path / "clip.mp4"), frames=30), "rb") as f:
+        return f.read()
+
+
+def _values(fields):
+    return {name: fields[name]["value"] for name in EXPECTED}
+
+
+def test_authenticate_pairs_fields_from_regions(video):
+    response = TestClient(main.app).post("/api/authenticate?image=none&merged=true",
+                                         files={"file": ("clip.mp4", video, "video/mp4")})
+    assert response.status_code == 200
+    body = response.json()
+    frames = body["frames"]
+    assert frames
+    for frame in frames:
+        # Batch and Name need the boxes: their labels and values are separate lines
+        assert _values(frame["fields"]) == EXPECTED
+        assert frame["message"]["<OCR>"] == "".join(benchmark.LABEL_LINES)
+    assert _values(body["fields"]) == EXPECTED
+    assert body["fields"]["Batch Number"]["frames"] == [frame["frame_number"] for frame in frames]
+
+
+def test_authenticate_returns_frame_list_by_default(video):
+    response = TestClient(main.app).post("/api/authenticate?image=none",
+                                         files={"file": ("clip.mp4", video, "video/mp4")})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+
+def test_finished_job_reports_merged_fields(video):
+    # The app's lifespan would also shut down the shared inference executor,
+    # so only the (daemon) job workers are started
+    main.job_manager.start()
+    client = TestClient(main.app)
+    job = client.post("/api/jobs/authenticate?image=none",
+                      files={"file": ("clip.mp4", video, "video/mp4")}).json()
+    for _ in range(100):
+        status = client.get(job["status_url"]).json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert status["status"] == "done"
+    assert _values(status["fields"]) == EXPECTED
+    assert len(status["results"]) == status["progress"]["frames_done"]
@@ -0,0 +1,44 @@
+import cv2 # type: ignore
+import numpy as np # type: ignore
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+pytest.importorskip("sam2")
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt # type: ignore
+
+from face_pixelator import FacePixelator
+
+
+def _write_video(path, frames=12, size=(96, 64)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 10, size)
+    for i in range(frames):
+        frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        cv2.rectangle(frame, (10 + i, 10), (40 + i, 40), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+@pytest.mark.parametrize("detect_every", [1, 4])
+def test_process_video_allocates_no_figures(tmp_path, monkeypatch, detect_every):
+    video = tmp_path / "input.mp4"
+    output = tmp_path / "output.mp4"
+    _write_video(video)
+
+    pixelator = FacePixelator()
+    detections = []
+
+    def find_all_faces(image):
+        detections.append(image.size)
+        return [[8, 8, 48, 48]]
+
+    monkeypatch.setattr(pixelator, "find_all_faces", find_all_faces)
+    plt.close("all")
+
+    pixelator.process_video(video, output, detect_every=detect_every)
+
+    assert detections
+    assert output.stat().st_size > 0
+    assert plt.get_fignums() == []
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import threading
+
+import pytest
+
+from inference_pool import InferenceExecutor, PoolFullError, InferenceTimeoutError
+
+
+def test_run_returns_result():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    try:
+        assert asyncio.run(executor.run(pow, 2, 10)) == 1024
+        assert executor.in_flight == 0
+    finally:
+        executor.shutdown()
+
+
+def test_pool_full_when_no_slot_is_free():
+    executor = InferenceExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        admitted = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 2
+        assert executor.queue_depth == 1
+        with pytest.raises(PoolFullError):
+            await executor.run(release.wait)
+        release.set()
+        assert await asyncio.gather(*admitted) == [True, True]
+
+    try:
+        asyncio.run(scenario())
+        assert executor.in_flight == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_timeout_keeps_slot_until_job_returns():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(release.wait, timeout=0.05)
+        # The worker thread is still busy, so there is no room for another job
+        with pytest.raises(PoolFullError):
+            await executor.run(pow, 2, 2)
+        release.set()
+        for _ in range(100):
+            if executor.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await executor.run(pow, 2, 2)
+
+    try:
+        assert asyncio.run(scenario()) == 4
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        InferenceExecutor(kind="fiber")
+
+
+class _FailingExecutor:
+    """Stands in for main.inference_executor, failing every run with error."""
+    def __init__(self, error):
+        self.error = error
+
+    async def run(self, fn, *args, **kwargs):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status", [
+    (PoolFullError("full"), 503),
+    (InferenceTimeoutError("slow"), 504),
+])
+def test_api_maps_executor_errors(monkeypatch, error, status):
+    pytest.importorskip("torch")
+    pytest.importorskip("supervision")
+    from fastapi.testclient import TestClient # type: ignore
+    import main
+
+    from PIL import Image # type: ignore
+
+    monkeypatch.setattr(main, "inference_executor", _FailingExecutor(error))
+    png = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(png, format="PNG")
+    client = TestClient(main.app)
+    # The video is only opened by the job itself, so any bytes will do
+    for url, name, data in (("/api/authenticate", "clip.mp4", b"not decoded"),
+                            ("/api/scan", "label.png", png.getvalue())):
+        response = client.post(url, files={"file": (name, data, "application/octet-stream")})
+        assert response.status_code == status
+        if status == 503:
+            assert response.headers["Retry-After"] == "5"
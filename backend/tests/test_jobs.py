@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from jobs import JobStore, JobLeaseLostError
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite")
+
+
+def test_claim_hands_each_job_to_one_store(db_path):
+    first, second = JobStore(db_path), JobStore(db_path)
+    ids = {first.create("authenticate", {"n": n}, None) for n in range(4)}
+    claimed = []
+    while True:
+        job = first.claim_next() if len(claimed) % 2 else second.claim_next()
+        if job is None:
+            break
+        claimed.append(job["id"])
+    assert sorted(claimed) == sorted(ids)
+    assert first.count("queued") == 0
+    assert first.count("running") == 4
+
+
+def test_claim_skips_job_taken_by_another_store(db_path):
+    first, second = JobStore(db_path), JobStore(db_path)
+    job_id = first.create("authenticate", {"profile": "fast"}, None)
+    job = first.claim_next()
+    assert job["id"] == job_id
+    assert job["params"] == {"profile": "fast"}
+    assert first.get(job_id)["owner"] == first.owner
+    assert second.claim_next() is None
+
+
+def test_expired_lease_is_requeued_without_partial_results(db_path):
+    worker = JobStore(db_path, lease_seconds=0.05)
+    job_id = worker.create("authenticate", {}, None)
+    worker.claim_next()
+    worker.add_frame(job_id, {"frame_number": 0})
+    worker.set_total(job_id, 5)
+
+    time.sleep(0.1)
+    other = JobStore(db_path)  # opening the store requeues expired leases
+    job = other.get(job_id)
+    assert job["status"] == "queued"
+    assert job["owner"] is None
+    assert job["frames_done"] == 0
+    assert job["frames_total"] is None
+    assert other.frames(job_id) == []
+
+    # The original worker finds out as soon as it reports progress
+    with pytest.raises(JobLeaseLostError):
+        worker.add_frame(job_id, {"frame_number": 1})
+    with pytest.raises(JobLeaseLostError):
+        worker.finish(job_id, "done")
+    assert other.claim_next()["id"] == job_id
+
+
+def test_renewed_lease_is_kept(db_path):
+    worker = JobStore(db_path, lease_seconds=0.2)
+    job_id = worker.create("authenticate", {}, None)
+    worker.claim_next()
+    time.sleep(0.15)
+    worker.renew_leases()
+    time.sleep(0.1)
+    assert worker.requeue_expired() == 0
+    assert worker.get(job_id)["status"] == "running"
+
+
+def test_frames_are_numbered_in_order(db_path):
+    store = JobStore(db_path)
+    job_id = store.create("authenticate", {}, None)
+    store.claim_next()
+    for n in range(3):
+        store.add_frame(job_id, {"frame_number": n * 10})
+    assert [frame["seq"] for frame in store.frames(job_id)] == [0, 1, 2]
+    assert store.frames(job_id, since=2) == [{"seq": 2, "frame_number": 20}]
+    assert store.get(job_id)["frames_done"] == 3
+
+
+def test_delete_finished_removes_old_jobs_and_outputs(db_path, tmp_path):
+    store = JobStore(db_path)
+    old_id = store.create("pixelate", {}, None)
+    store.claim_next()
+    output = tmp_path / "out.mp4"
+    output.write_bytes(b"video")
+    store.finish(old_id, "done", output_path=str(output))
+    running_id = store.create("pixelate", {}, None)
+    store.claim_next()
+
+    assert store.delete_finished(older_than=60) == 0
+    time.sleep(0.05)
+    assert store.delete_finished(older_than=0.01) == 1
+    assert store.get(old_id) is None
+    assert not os.path.exists(output)
+    assert store.get(running_id)["status"] == "running"
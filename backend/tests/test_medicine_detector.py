@@ -0,0 +1,145 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+
+import json
+
+import cv2  # type: ignore
+import numpy as np  # type: ignore
+from PIL import Image  # type: ignore
+import benchmark
+import detect_text
+from medicine_detector import MedicineDetector, check_reference_accuracy
+from medicine_fields import field_values
+
+
+def _quad(x0, y0, x1, y1):
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+def _fake_generate(calls):
+    """
+    Stands in for Florence-2: answers both prompts for a frame from the same
+    lines, with <OCR> reading them top-to-bottom, left-to-right and no
+    separators, like the real model.
+    """
+    def generate(task_prompt, text_input, images, profile):
+        calls.append((task_prompt, len(images)))
+        answers = []
+        for image in images:
+            shade = image.getpixel((0, 0))[0]
+            regions = [
+                (_quad(10, 10, 200, 30), f"Batch No. B{shade}"),
+                (_quad(10, 42, 90, 60), "MRP Rs."),
+                (_quad(120, 40, 180, 62), f"{shade}.50"),
+                (_quad(10, 80, 150, 100), "Exp. 12/2027"),
+            ]
+            if task_prompt == "<OCR_WITH_REGION>":
+                # Out of reading order, as the model's boxes often are
+                regions = regions[::-1]
+                answers.append({task_prompt: {
+                    "quad_boxes": [quad for quad, _ in regions],
+                    "labels": [label for _, label in regions],
+                }})
+            else:
+                answers.append({task_prompt: "".join(label for _, label in regions)})
+        return answers
+    return generate
+
+
+def test_single_pass_matches_two_pass(monkeypatch):
+    calls = []
+    monkeypatch.setattr(detect_text, "_generate_batch", _fake_generate(calls))
+    images = [Image.new("RGB", (240, 120), (shade, shade, shade)) for shade in (40, 90)]
+
+    two_pass = MedicineDetector(single_pass=False, crop_roi=False)._analyze_frames(images)
+    assert [prompt for prompt, _ in calls] == ["<OCR_WITH_REGION>", "<OCR>"]
+
+    calls.clear()
+    single = MedicineDetector(single_pass=True, crop_roi=False)._analyze_frames(images)
+    assert calls == [("<OCR_WITH_REGION>", 2)]
+
+    assert single == two_pass
+    assert single[0]["full_text"] == "Batch No. B40MRP Rs.40.50Exp. 12/2027"
+
+
+# Every SHARP_EVERY-th frame of the synthetic clip is sharp, the rest are blurred
+SHARP_EVERY = 5
+GARBLED_LINES = ["PARACFTAM0L 65O", "B.N0. A81Z34", "MRP Rs. 3O.5O", "MFG 01/2O24  EXP 1Z/2O25"]
+
+
+def _make_clip(path, frames=45, width=640, height=360):
+    """A drifting benchmark label in which only every SHARP_EVERY-th frame is in focus."""
+    base = np.asarray(benchmark.make_image(width * 2, height))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (width, height))
+    try:
+        for i in range(frames):
+            frame = np.ascontiguousarray(base[:, i * 8:i * 8 + width])
+            if i % SHARP_EVERY:
+                frame = cv2.GaussianBlur(frame, (0, 0), 6)
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    finally:
+        writer.release()
+    return path
+
+
+def _sharpness_ocr(calls, always_garbled=False):
+    """
+    Stands in for Florence-2: reads the benchmark label lines from a sharp
+    image and misreads them from a blurred one.
+    """
+    def generate(task_prompt, text_input, images, profile):
+        calls.append((task_prompt, len(images)))
+        answers = []
+        for image in images:
+            gray = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2GRAY)
+            answer = benchmark.stub_answer(task_prompt, image.width, image.height)
+            if always_garbled or cv2.Laplacian(gray, cv2.CV_64F).var() < 100:
+                if task_prompt == "<OCR_WITH_REGION>":
+                    answer[task_prompt]["labels"] = list(GARBLED_LINES)
+                elif task_prompt == "<OCR>":
+                    answer[task_prompt] = " ".join(GARBLED_LINES)
+            answers.append(answer)
+        return answers
+    return generate
+
+
+def test_process_video_picks_sharp_keyframes_and_reads_fields(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(detect_text, "_generate_batch", _sharpness_ocr(calls))
+    clip = _make_clip(str(tmp_path / "clip.mp4"))
+
+    detector = MedicineDetector(num_keyframes=3, crop_roi=False)
+    results = detector.process_video(clip)
+    frame_numbers = [result["frame_number"] for result in results]
+    assert len(frame_numbers) == 3
+    assert frame_numbers == sorted(set(frame_numbers))
+    assert all(number % SHARP_EVERY == 0 for number in frame_numbers)
+    # Both prompts ran once over all keyframes
+    assert calls == [("<OCR_WITH_REGION>", 3), ("<OCR>", 3)]
+
+    merged = detector.merged_fields(results)
+    assert field_values(merged) == {
+        "Name": "PARACETAMOL 650", "Quantity": None, "Batch Number": "AB1234",
+        "MRP": 30.5, "Expiry Date": "2025-12",
+    }
+    assert merged["Batch Number"]["frames"] == frame_numbers
+
+
+def test_check_reference_accuracy_on_synthetic_clip(monkeypatch, tmp_path):
+    monkeypatch.setattr(detect_text, "_generate_batch", _sharpness_ocr([]))
+    clip = _make_clip(str(tmp_path / "clip.mp4"))
+    reference_path = tmp_path / "reference.json"
+    reference_path.write_text(json.dumps(MedicineDetector(num_keyframes=3, crop_roi=False).process_video(clip)))
+
+    report = check_reference_accuracy(clip, str(reference_path))
+    assert report["passed"]
+    assert len(report["frames"]) == 3
+    assert all(frame["field_accuracy"] == 1.0 for frame in report["frames"])
+
+    # A backend that misreads the labels fails the check on text and fields
+    monkeypatch.setattr(detect_text, "_generate_batch", _sharpness_ocr([], always_garbled=True))
+    report = check_reference_accuracy(clip, str(reference_path))
+    assert not report["passed"]
+    assert all(frame["field_accuracy"] < 0.5 for frame in report["frames"])
@@ -0,0 +1,112 @@
+import pytest
+
+from medicine_fields import (
+    extract_fields, field_values, merge_fields, parse_batch, parse_date, parse_price,
+    parse_quantity, region_items, text_items, LABELED_INLINE, LABELED_NEARBY, UNIT_COUNT,
+)
+
+
+def quad(x0, y0, x1, y1):
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12/2025", "2025-12"),
+    ("EXP 12/2025", "2025-12"),
+    ("Exp. DEC 2026", "2026-12"),
+    ("MFG 01/24", "2024-01"),
+    ("05/13/2025", None),
+    ("12/1999", None),
+    ("PARACETAMOL", None),
+])
+def test_parse_date(text, expected):
+    assert parse_date(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Rs. 30.50", 30.5),
+    (": 45/-", 45.0),
+    ("Rs. 1,250.00", 1250.0),
+    ("15 Tablets", None),
+    ("Rs. 250000", None),
+    ("N/A", None),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    (": ab1234", "AB1234"),
+    ("# BX-2291", "BX-2291"),
+    ("PARACETAMOL", None),
+])
+def test_parse_batch(text, expected):
+    assert parse_batch(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("15 Tablets", 15),
+    ("1 x 10's", 10),
+    ("Strip of 15", 15),
+    ("MRP Rs. 30.50", None),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+def test_extract_fields_pairs_labels_with_values_by_position():
+    items = [
+        (quad(10, 10, 200, 30), "PARACETAMOL 650"),
+        (quad(10, 40, 80, 60), "B.No."),
+        (quad(90, 40, 160, 60), "AB1234"),
+        (quad(10, 70, 200, 90), "MRP Rs. 30.50"),
+        (quad(10, 100, 200, 120), "EXP 12/2025"),
+        (quad(10, 130, 200, 150), "15 Tablets"),
+    ]
+    fields = extract_fields(items)
+    assert field_values(fields) == {
+        "Name": "PARACETAMOL 650", "Quantity": 15, "Batch Number": "AB1234",
+        "MRP": 30.5, "Expiry Date": "2025-12",
+    }
+    # The batch label and its value are separate boxes on one line
+    assert fields["Batch Number"]["confidence"] in (LABELED_INLINE, LABELED_NEARBY)
+    assert fields["MRP"]["confidence"] == LABELED_INLINE
+    assert fields["Quantity"]["confidence"] == UNIT_COUNT
+
+
+def test_extract_fields_reads_value_below_its_label():
+    items = [
+        (quad(10, 10, 90, 30), "Batch No."),
+        (quad(10, 40, 90, 60), "XY7781"),
+        (quad(120, 10, 200, 30), "Exp. Date"),
+        (quad(120, 40, 200, 60), "06/2027"),
+    ]
+    fields = extract_fields(items)
+    assert fields["Batch Number"]["value"] == "XY7781"
+    assert fields["Expiry Date"]["value"] == "2027-06"
+    assert fields["Expiry Date"]["confidence"] == LABELED_NEARBY
+
+
+def test_region_and_text_items():
+    region = {"quad_boxes": [quad(0, 0, 10, 10)], "labels": ["MRP Rs. 12"]}
+    assert region_items(region) == [(quad(0, 0, 10, 10), "MRP Rs. 12")]
+    assert region_items("not a result") == []
+    assert text_items("MRP Rs. 12\n\n B.No. AB1234") == [(None, "MRP Rs. 12"), (None, " B.No. AB1234")]
+    assert field_values(extract_fields(text_items("MRP Rs. 12\nB.No. AB1234")))["MRP"] == 12.0
+
+
+def test_merge_fields_pools_agreeing_frames():
+    agree = {"Batch Number": {"value": "AB1234", "confidence": 0.5}}
+    disagree = {"Batch Number": {"value": "A81234", "confidence": 0.5}}
+    merged = merge_fields([agree, agree, disagree, {}], frame_numbers=[0, 30, 60, 90])
+    batch = merged["Batch Number"]
+    assert batch["value"] == "AB1234"
+    assert batch["frames"] == [0, 30]
+    # Two frames at 0.5 pool to 0.75, discounted by half the dissenting 0.5
+    assert batch["confidence"] == pytest.approx(0.75 * 0.75, abs=1e-3)
+    assert merged["MRP"] is None
+
+
+def test_merge_fields_single_frame_keeps_confidence():
+    merged = merge_fields([{"MRP": {"value": 30.5, "confidence": 0.9}}])
+    assert merged["MRP"] == {"value": 30.5, "confidence": 0.9, "frames": [0]}
@@ -0,0 +1,100 @@
+import io
+import json
+
+import httpx # type: ignore
+import numpy as np # type: ignore
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+
+import ocr
+from ocr_cascade import OCRCascade
+
+REPLY = {"Name": "Paracetamol 500", "Quantity": "15 tablets", "Batch Number": "B1234",
+         "MRP": "Rs. 25.50", "Expiry Date": "12/2027"}
+
+
+def test_llm_tier_uses_the_shared_client(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"message": {"content": json.dumps(REPLY)}})
+
+    client = ocr.OllamaOCRClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ocr, "ocr_client", client)
+    cascade = OCRCascade(max_tier="llm")
+    try:
+        fields, confidence = cascade._llm(np.full((64, 64, 3), 10, dtype=np.uint8))
+        http = client._client
+        cascade._llm(np.full((64, 64, 3), 20, dtype=np.uint8))
+
+        assert http is not None and client._client is http
+        assert len(requests) == 2
+        assert confidence is None
+        assert fields["MRP"] == {"value": 25.5, "confidence": None, "source": "llm"}
+        assert fields["Quantity"]["value"] == 15
+    finally:
+        ocr.shutdown_ocr_client()
+
+
+def _stub_tiers(monkeypatch, cascade, easyocr_fields, florence_fields=None):
+    """EasyOCR answers with easyocr_fields; Florence-2 with florence_fields, or fails if None."""
+    monkeypatch.setattr(cascade, "_easyocr", lambda image: (easyocr_fields, 0.9))
+
+    def florence(image):
+        if florence_fields is None:
+            raise RuntimeError("model unavailable")
+        return florence_fields, None
+    monkeypatch.setattr(cascade, "_florence", florence)
+
+
+def _found(**values):
+    return {name: {"value": value, "confidence": 0.9, "source": str(value)} for name, value in values.items()}
+
+
+PARTIAL = _found(Name="PARACETAMOL 650")
+COMPLETE = _found(Name="PARACETAMOL 650", **{"Batch Number": "AB1234", "MRP": 30.5, "Expiry Date": "2025-12"})
+
+
+def test_read_records_failed_tiers(monkeypatch):
+    cascade = OCRCascade(max_tier="florence")
+    _stub_tiers(monkeypatch, cascade, PARTIAL)
+    result = cascade.read(np.zeros((32, 32, 3), dtype=np.uint8))
+    assert result["tier"] == "easyocr"
+    assert result["tried"] == ["easyocr", "florence"]
+    assert result["failed"] == ["florence"]
+    assert not cascade.good_enough(result)
+
+
+def _scan(monkeypatch, florence_fields):
+    from fastapi.testclient import TestClient # type: ignore
+    from PIL import Image # type: ignore
+    import main
+    from result_cache import ResultCache
+
+    cascade = OCRCascade(max_tier="florence")
+    _stub_tiers(monkeypatch, cascade, PARTIAL, florence_fields)
+    cache = ResultCache()
+    monkeypatch.setattr(main, "ocr_cascade", cascade)
+    monkeypatch.setattr(main, "result_cache", cache)
+    png = io.BytesIO()
+    Image.new("RGB", (32, 32)).save(png, format="PNG")
+    response = TestClient(main.app).post("/api/scan", files={"file": ("label.png", png.getvalue(), "image/png")})
+    assert response.status_code == 200
+    return response.json(), cache
+
+
+def test_scan_does_not_cache_answer_of_degraded_cascade(monkeypatch):
+    result, cache = _scan(monkeypatch, florence_fields=None)
+    assert result["tier"] == "easyocr"
+    assert result["failed"] == ["florence"]
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_scan_caches_answer_of_healthy_cascade(monkeypatch):
+    result, cache = _scan(monkeypatch, florence_fields=COMPLETE)
+    assert result["tier"] == "florence"
+    assert result["failed"] == []
+    assert cache.stats()["memory_entries"] == 1
@@ -0,0 +1,92 @@
+import cv2 # type: ignore
+import numpy as np # type: ignore
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+pytest.importorskip("sam2")
+
+from face_pixelator import FacePixelator
+
+
+def pixelate_region_loop(image, masks, pixelation_size=10):
+    """The original block-by-block pixelate_region, kept as the reference for its output."""
+    image = image.copy()
+    masks = masks.astype(bool)
+    height, width = image.shape[:2]
+    pixelated_image = image.copy()
+
+    for y in range(0, height, pixelation_size):
+        for x in range(0, width, pixelation_size):
+            block_y_end = min(y + pixelation_size, height)
+            block_x_end = min(x + pixelation_size, width)
+            block = image[y:block_y_end, x:block_x_end]
+
+            combined_block_mask = np.zeros(block.shape[:2], dtype=bool)
+            for mask in masks:
+                block_mask = mask[y:block_y_end, x:block_x_end]
+                combined_block_mask = np.logical_or(combined_block_mask, block_mask)
+
+            if combined_block_mask.any():
+                average_color = [int(np.mean(channel[combined_block_mask]))
+                                 for channel in cv2.split(block)]
+                for c in range(3):
+                    block[:, :, c][combined_block_mask] = average_color[c]
+                pixelated_image[y:block_y_end, x:block_x_end] = block
+
+    return pixelated_image
+
+
+def _boxes(rng, width, height, count):
+    """Random boxes, some reaching past the image edges or degenerate."""
+    boxes = []
+    for _ in range(count):
+        x1, y1 = rng.integers(-20, width), rng.integers(-20, height)
+        boxes.append([float(x1), float(y1), float(x1 + rng.integers(0, width // 2)),
+                      float(y1 + rng.integers(0, height // 2))])
+    boxes.append([width - 7.5, height - 3.2, width + 40.0, height + 40.0])
+    return boxes
+
+
+def _masks(boxes, width, height):
+    masks = np.zeros((len(boxes), height, width), dtype=np.uint8)
+    for mask, box in zip(masks, boxes):
+        x1, y1, x2, y2 = [max(0, int(coord)) for coord in box]
+        mask[y1:y2, x1:x2] = 1
+    return masks
+
+
+@pytest.fixture(scope="module")
+def pixelator():
+    return FacePixelator()
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("pixelation_size", [1, 3, 7, 10, 16])
+@pytest.mark.parametrize("size", [(97, 61), (160, 120)])
+def test_pixelation_matches_the_reference_loop(pixelator, seed, pixelation_size, size):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    boxes = _boxes(rng, width, height, 4)
+    masks = _masks(boxes, width, height)
+    expected = pixelate_region_loop(image, masks, pixelation_size)
+
+    region = pixelator.pixelate_region(image, masks, pixelation_size)
+    assert region.tobytes() == expected.tobytes()
+    assert pixelator.pixelate_region(image, masks.any(axis=0), pixelation_size).tobytes() == expected.tobytes()
+
+    boxed = pixelator._pixelate_boxes(image, boxes, pixelation_size=pixelation_size)
+    assert boxed.tobytes() == expected.tobytes()
+
+
+def test_pixelation_in_place_and_without_masks(pixelator):
+    image = np.random.default_rng(0).integers(0, 256, (50, 70, 3), dtype=np.uint8)
+    untouched = image.copy()
+    assert pixelator.pixelate_region(image, np.zeros((1, 50, 70), dtype=np.uint8)).tobytes() == untouched.tobytes()
+    assert pixelator._pixelate_boxes(image, [[80, 80, 90, 90]]).tobytes() == untouched.tobytes()
+
+    expected = pixelate_region_loop(image, _masks([[5, 5, 33, 41]], 70, 50))
+    result = pixelator._pixelate_boxes(image, [[5, 5, 33, 41]], inplace=True)
+    assert result is image
+    assert image.tobytes() == expected.tobytes()
@@ -0,0 +1,75 @@
+import json
+
+from result_cache import ResultCache
+
+
+def _size(value) -> int:
+    return len(json.dumps(value))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    value = {"text": "x" * 100}
+    cache = ResultCache(max_memory_bytes=3 * _size(value))
+    for key in ("a", "b", "c"):
+        cache.put(key, value)
+    assert cache.get("a") == value  # "b" is now the least recently used
+    cache.put("d", value)
+    assert cache.get("b") is None
+    assert cache.get("a") == value
+    stats = cache.stats()
+    assert stats["memory_entries"] == 3
+    assert stats["memory_bytes"] <= cache.max_memory_bytes
+    assert stats["evictions"] == 1
+
+
+def test_values_larger_than_memory_tier_are_not_kept():
+    cache = ResultCache(max_memory_bytes=10)
+    cache.put("big", "x" * 100)
+    assert cache.get("big") is None
+    assert cache.stats()["memory_bytes"] == 0
+
+
+def test_returned_values_are_copies():
+    cache = ResultCache()
+    cache.put("key", {"fields": ["AB1234"]})
+    first = cache.get("key")
+    first["fields"].append("mutated")
+    assert cache.get("key") == {"fields": ["AB1234"]}
+
+
+def test_disk_tier_survives_restart_and_promotes_hits(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    ResultCache(disk_path=path).put("key", [1, 2, 3])
+
+    cache = ResultCache(disk_path=path)
+    assert cache.get("key") == [1, 2, 3]
+    assert cache.get("key") == [1, 2, 3]
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["disk_entries"] == 1
+
+
+def test_disk_tier_evicts_least_recently_accessed(tmp_path):
+    value = {"text": "x" * 100}
+    cache = ResultCache(max_memory_bytes=0, disk_path=str(tmp_path / "results.sqlite"),
+                        max_disk_bytes=2 * _size(value))
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.get("a") == value  # refreshes "a", leaving "b" the oldest
+    cache.put("c", value)
+    assert cache.get("b") is None
+    assert cache.get("a") == value
+    assert cache.get("c") == value
+    stats = cache.stats()
+    assert stats["disk_entries"] == 2
+    assert stats["disk_bytes"] <= cache.max_disk_bytes
+
+
+def test_get_or_compute_computes_once():
+    cache = ResultCache()
+    calls = []
+    compute = lambda: calls.append(1) or {"answer": 42}
+    assert cache.get_or_compute("key", compute) == {"answer": 42}
+    assert cache.get_or_compute("key", compute) == {"answer": 42}
+    assert len(calls) == 1
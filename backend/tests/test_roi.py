@@ -0,0 +1,57 @@
+import numpy as np # type: ignore
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("torch")
+pytest.importorskip("supervision")
+
+from roi import find_text_region, tile_boxes
+
+LABEL = (700, 300, 1100, 560)
+
+
+def _frame(lines, background=100):
+    """A 1280x720 frame with a light label at LABEL carrying lines of dark text."""
+    frame = np.full((720, 1280, 3), background, np.uint8)
+    if lines:
+        cv2.rectangle(frame, LABEL[:2], LABEL[2:], (235, 235, 230), -1)
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (LABEL[0] + 20, LABEL[1] + 50 + i * 55),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2)
+    return frame
+
+
+def test_finds_label_text():
+    box = find_text_region(_frame(["PARACETAMOL 650", "B.No. AB1234", "MRP Rs. 30.50", "EXP 12/2025"]))
+    assert box is not None
+    x1, y1, x2, y2 = box
+    # Covers every line of text, and little of the frame around it
+    assert x1 <= LABEL[0] + 20 and y1 <= LABEL[1] + 25
+    assert x2 >= LABEL[0] + 290 and y2 >= LABEL[1] + 215
+    assert (x2 - x1) * (y2 - y1) < 0.2 * 1280 * 720
+
+
+def test_accepts_pil_images():
+    from PIL import Image # type: ignore
+    frame = _frame(["MRP Rs. 30.50", "EXP 12/2025"])
+    assert find_text_region(Image.fromarray(frame)) == find_text_region(frame)
+
+
+def test_blank_frame_has_no_region():
+    assert find_text_region(_frame([])) is None
+
+
+def test_region_covering_most_of_frame_is_not_cropped():
+    frame = np.full((200, 320, 3), 235, np.uint8)
+    for y in range(25, 200, 30):
+        cv2.putText(frame, "B.No. AB1234 MRP 30.50", (5, y), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (20, 20, 20), 1)
+    assert find_text_region(frame) is None
+
+
+def test_tile_boxes_cover_the_region():
+    box = (0, 0, 3000, 1000)
+    tiles = tile_boxes(box, tile_size=1152)
+    assert len(tiles) > 1
+    assert min(t[0] for t in tiles) == 0 and max(t[2] for t in tiles) == 3000
+    assert min(t[1] for t in tiles) == 0 and max(t[3] for t in tiles) == 1000
+    assert tile_boxes((0, 0, 500, 400), tile_size=1152) == [(0, 0, 500, 400)]
@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request # type: ignore
+from fastapi.testclient import TestClient # type: ignore
+
+from uploads import save_upload
+
+MAX_BYTES = 1024
+
+
+def _check_filename(filename):
+    if not filename.endswith(".mp4"):
+        raise HTTPException(status_code=400, detail="Unsupported video format")
+
+
+app = FastAPI()
+
+
+@app.post("/upload")
+async def upload(request: Request):
+    saved = await save_upload(request, check_filename=_check_filename, max_bytes=MAX_BYTES)
+    with open(saved.path, "rb") as f:
+        content = f.read()
+    os.unlink(saved.path)
+    return {"sha256": saved.sha256, "size": saved.size, "filename": saved.filename,
+            "suffix": os.path.splitext(saved.path)[1], "content_sha256": hashlib.sha256(content).hexdigest()}
+
+
+client = TestClient(app)
+
+
+def test_streams_the_file_field_to_disk():
+    body = os.urandom(1000)
+    response = client.post("/upload", data={"note": "x" * 50}, files={"file": ("clip.mp4", body, "video/mp4")})
+    assert response.status_code == 200
+    assert response.json() == {"sha256": hashlib.sha256(body).hexdigest(), "size": 1000, "filename": "clip.mp4",
+                               "suffix": ".mp4", "content_sha256": hashlib.sha256(body).hexdigest()}
+
+
+def test_rejects_oversized_files():
+    response = client.post("/upload", files={"file": ("clip.mp4", b"x" * (MAX_BYTES + 1), "video/mp4")})
+    assert response.status_code == 413
+
+
+def test_rejects_on_declared_length_before_reading():
+    read = []
+
+    async def receive():
+        read.append(True)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    request = Request({"type": "http", "method": "POST", "headers": [
+        (b"content-type", b"multipart/form-data; boundary=x"),
+        (b"content-length", str(10 * 1024 * 1024).encode()),
+    ]}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_upload(request, max_bytes=MAX_BYTES))
+    assert error.value.status_code == 413
+    assert read == []
+
+
+@pytest.mark.parametrize("files, status", [
+    ({"file": ("clip.avi.txt", b"data", "text/plain")}, 400),
+    ({"file": ("clip.mp4", b"", "video/mp4")}, 400),
+    ({"other": ("clip.mp4", b"data", "video/mp4")}, 400),
+])
+def test_rejects_bad_uploads(files, status):
+    assert client.post("/upload", files=files).status_code == status
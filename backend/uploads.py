@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import aiofiles # type: ignore
+from fastapi import Request, HTTPException # type: ignore
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header # type: ignore
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header # type: ignore
+from metrics import observe_stage, counter
+
+UPLOAD_BYTES = counter("scanner_upload_bytes_total", "Bytes of uploads written to disk")
+
+# Uploads larger than this are rejected with 413 (MAX_UPLOAD_MB, default 200)
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+# Room for multipart boundaries and part headers on top of the file itself
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Endpoints read their upload from the request stream, so FastAPI cannot infer
+# the form; this documents it in the OpenAPI schema instead
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    },
+}
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    filename: str
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes} bytes.")
+
+
+async def save_upload(request: Request, field: str = "file", check_filename: Optional[Callable] = None,
+                      max_bytes: int = MAX_UPLOAD_BYTES) -> SavedUpload:
+    """
+    Stream the file in the multipart form field of request straight from the
+    socket to a temporary file, hashing it on the way, without the form being
+    spooled to disk first. A declared Content-Length over the limit is
+    rejected with 413 before any of the body is read; otherwise 413 is raised
+    as soon as the limit is exceeded. check_filename(filename), if given, runs
+    before the file's first byte is written and may raise to reject it.
+    Raises 400 for a missing or empty file; the partial file is removed on
+    any error. The caller owns (and must delete) the returned path.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    declared_size = request.headers.get("content-length")
+    if declared_size is not None and declared_size.isdigit() and int(declared_size) > max_bytes + FORM_OVERHEAD_BYTES:
+        raise _too_large(max_bytes)
+
+    # The parser reports through callbacks; they only record events, which
+    # are acted on (asynchronously) after each chunk is parsed
+    events: List = []
+    header = {"field": b"", "value": b""}
+    part_headers = {}
+
+    def on_part_begin():
+        part_headers.clear()
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part_headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part_headers.get(b"content-disposition", b""))
+        events.append(("part", disposition.get(b"name", b"").decode("latin-1"),
+                       disposition.get(b"filename", b"").decode("utf-8", "replace")))
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end",))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = received = 0
+    filename = None
+    in_file = done = False
+    start = time.perf_counter()
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_bytes + FORM_OVERHEAD_BYTES:
+                    raise _too_large(max_bytes)
+                parser.write(chunk)
+                for event in events:
+                    if event[0] == "part":
+                        in_file = event[1] == field and not done
+                        if in_file:
+                            filename = event[2]
+                            if check_filename is not None:
+                                check_filename(filename)
+                    elif event[0] == "data" and in_file:
+                        size += len(event[1])
+                        if size > max_bytes:
+                            raise _too_large(max_bytes)
+                        digest.update(event[1])
+                        await out.write(event[1])
+                    elif event[0] == "end" and in_file:
+                        in_file, done = False, True
+                events.clear()
+            parser.finalize()
+        if filename is None:
+            raise HTTPException(status_code=400, detail=f"No '{field}' file in the upload")
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        # Keep the upload's extension
+        suffix = os.path.splitext(filename)[1].lower()
+        if suffix:
+            os.replace(path, path + suffix)
+            path += suffix
+        observe_stage("upload_write", time.perf_counter() - start)
+        UPLOAD_BYTES.inc(size)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SavedUpload(path, digest.hexdigest(), size, filename)